@@ -1,6 +1,8 @@
 
 from .utils import (
     tf, os, np, plt, logger, ap, BooleanAction, 
-    debug, toc, auto_increment
+    debug, toc, auto_increment, import_times, device_info
 )
+from . import bench
+from .cache import StepCache
 
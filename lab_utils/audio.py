@@ -0,0 +1,115 @@
+"""Decoded and resampled waveforms on disk, so later runs skip decoding and resampling.
+
+    store = AudioStore('esc50', filenames, load_wav_16k_mono.python_function)
+    wav_ds = store.dataset(lambda: files_ds.map(load_wav_16k_mono))
+
+The first run iterates the dataset of waveforms built by build() (one 1-D
+float32 tensor per file, in file order) and appends them to a single raw
+float32 file; meta.json holds the offset of every waveform. Later runs map
+that file and read each waveform as a slice of it: nothing is decoded,
+resampled or copied in Python, and only the pages that are read are loaded.
+An entry is keyed by the source files (path, size and mtime) and by the
+functions and values that load them. Entries live under
+<--cache-dir>/audio/<lab> and are only used with --cache.
+"""
+import json
+import os
+import shutil
+import time
+
+from .utils import args as _args, logger, np, tf
+from .cache import fingerprint
+from .features import _paths, lab_name
+
+
+class AudioStore():
+    def __init__(self, name, files, *params, rate=16000, args=None, root=None, enabled=None):
+        args = args or _args
+        self.enabled = args.cache if enabled is None else enabled
+        self.name = name
+        self.files = _paths(files)
+        self.rate = rate
+        self.key = fingerprint(*self.files, params, rate)
+        # per lab, like FeatureStore: write() replaces the entries of the same name
+        root = root or os.path.join(args.cache_dir, 'audio', lab_name())
+        self.path = os.path.join(root, f'{name}-{self.key[:16]}')
+        self.meta = None
+        self.values = None
+
+    def valid(self):
+        return os.path.exists(os.path.join(self.path, 'meta.json'))
+
+    def write(self, waveforms):
+        start = time.perf_counter()
+        tmp = f'{self.path}.tmp{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        offsets = [0]
+        with open(os.path.join(tmp, 'waveforms.f32'), 'wb') as f:
+            for wav in waveforms:
+                wav = np.ascontiguousarray(wav, dtype=np.float32).reshape(-1)
+                f.write(wav.tobytes())
+                offsets.append(offsets[-1] + len(wav))
+        if len(offsets) - 1 != len(self.files):
+            raise ValueError(f'{self.name}: {len(offsets) - 1} waveforms for {len(self.files)} files')
+
+        # meta last: the entry only counts as written once the waveforms are complete
+        meta = {
+            'name': self.name, 'key': self.key, 'rate': self.rate,
+            'files': self.files, 'offsets': offsets, 'created': time.time(),
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        prefix = f'{self.name}-'
+        root = os.path.dirname(self.path)
+        for entry in os.listdir(root):
+            if entry.startswith(prefix) and '.tmp' not in entry:
+                shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        os.rename(tmp, self.path)
+        seconds = offsets[-1] / self.rate
+        logger.info(f'{self.name}: {len(self.files)} files ({seconds:.0f} secs of audio) resampled and saved to {self.path} ({time.perf_counter() - start:.2f} secs)')
+        return self.open()
+
+    def open(self):
+        if self.values is None:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                self.meta = json.load(f)
+            self.offsets = np.array(self.meta['offsets'], dtype=np.int64)
+            self.index = {name: i for i, name in enumerate(self.meta['files'])}
+            path = os.path.join(self.path, 'waveforms.f32')
+            if self.offsets[-1]:
+                self.values = np.memmap(path, dtype=np.float32, mode='r')
+            else: # mmap can't map an empty file
+                self.values = np.zeros(0, dtype=np.float32)
+        return self
+
+    def waveform(self, file):
+        """The waveform of a file (or of the i-th file) as a read-only view of the mapped file."""
+        self.open()
+        i = file if isinstance(file, (int, np.integer)) else self.index[_paths([file])[0]]
+        return self.values[self.offsets[i]:self.offsets[i+1]]
+
+    def load(self):
+        """Dataset of the waveforms, in file order."""
+        self.open()
+
+        def read(i):
+            return np.asarray(self.waveform(int(i)))
+
+        def load_waveform(i):
+            wav = tf.numpy_function(read, [i], tf.float32)
+            wav.set_shape([None])
+            return wav
+
+        ds = tf.data.Dataset.range(len(self.files))
+        return ds.map(load_waveform, num_parallel_calls=tf.data.AUTOTUNE)
+
+    def dataset(self, build):
+        """The stored waveforms, or build() them, store them and serve them from disk."""
+        if not self.enabled:
+            return build()
+        if not self.valid():
+            self.write(build().prefetch(tf.data.AUTOTUNE).as_numpy_iterator())
+        return self.load()
@@ -0,0 +1,112 @@
+"""Stateless random augmentations of whole batches, with per-example parameters.
+
+tf.image.stateless_random_* ops take one image and one seed, so augmenting a
+dataset means a map call (and a handful of small ops) per image. Here every
+family is a single vectorized op over a (batch, height, width, channels)
+batch: the per-example parameters (crop offsets, flips, brightness deltas,
+rotation angles) are drawn at once from the batch seed with
+tf.random.stateless_uniform, then applied together (crop_and_resize,
+tf.where, a broadcast add, one projective transform).
+
+The stateless guarantee is per batch: the same batch and the same seed give
+the same result, in any order and on any run, e.g. with the seeds of
+tf.data.experimental.Counter():
+
+    counter = tf.data.experimental.Counter()
+    ds = tf.data.Dataset.zip((ds.batch(32), (counter, counter)))
+    ds = ds.map(lambda batch, seed: (augmentation.augment(batch[0], seed, crop_size=[180, 180]), batch[1]))
+
+The draws differ from those of the per-image ops, so a batch is not
+augmented exactly like its images one by one with the same seed.
+"""
+import math
+
+from .utils import tf
+
+
+def _seeds(seed, num):
+    # num independent seeds from one seed, one per random family
+    return tf.unstack(tf.random.experimental.stateless_split(seed, num=num))
+
+
+def random_crop(images, size, seed):
+    """A random (height, width) window of every image (one crop_and_resize call)."""
+    shape = tf.shape(images)
+    batch_size, image_height, image_width = shape[0], shape[1], shape[2]
+    height, width = size
+
+    # integer offsets in [0, image - crop], like stateless_random_crop
+    limits = tf.cast(tf.stack([image_height - height + 1, image_width - width + 1]), tf.float32)
+    offsets = tf.floor(tf.random.stateless_uniform([batch_size, 2], seed=seed) * limits)
+
+    # boxes in normalized coordinates that sample exactly the pixels of the window
+    scale = tf.cast(tf.stack([image_height - 1, image_width - 1]), tf.float32)
+    scale = tf.maximum(scale, 1.)
+    top_left = offsets / scale
+    bottom_right = (offsets + tf.constant([height - 1, width - 1], tf.float32)) / scale
+    boxes = tf.concat([top_left, bottom_right], axis=1)
+
+    crops = tf.image.crop_and_resize(tf.cast(images, tf.float32), boxes, tf.range(batch_size), [height, width])
+    return tf.cast(crops, images.dtype)
+
+
+def random_flip_left_right(images, seed):
+    flip = tf.random.stateless_uniform([tf.shape(images)[0]], seed=seed) < 0.5
+    return tf.where(flip[:, tf.newaxis, tf.newaxis, tf.newaxis], tf.reverse(images, axis=[2]), images)
+
+
+def random_flip_up_down(images, seed):
+    flip = tf.random.stateless_uniform([tf.shape(images)[0]], seed=seed) < 0.5
+    return tf.where(flip[:, tf.newaxis, tf.newaxis, tf.newaxis], tf.reverse(images, axis=[1]), images)
+
+
+def random_brightness(images, max_delta, seed):
+    """images + delta, one delta in [-max_delta, max_delta) per image."""
+    delta = tf.random.stateless_uniform(
+        [tf.shape(images)[0], 1, 1, 1], minval=-max_delta, maxval=max_delta, seed=seed, dtype=images.dtype
+    )
+    return images + delta
+
+
+def random_rotation(images, factor, seed, fill_mode='reflect', interpolation='bilinear'):
+    """Rotate every image by its own angle in [-factor, factor] x 2pi around its center.
+
+    The same transform as RandomRotation(factor), applied to the whole batch
+    by one ImageProjectiveTransformV2 op.
+    """
+    shape = tf.shape(images)
+    batch_size = shape[0]
+    height, width = tf.cast(shape[1], tf.float32), tf.cast(shape[2], tf.float32)
+
+    angles = tf.random.stateless_uniform(
+        [batch_size], minval=-factor * 2 * math.pi, maxval=factor * 2 * math.pi, seed=seed
+    )
+    cos, sin = tf.cos(angles), tf.sin(angles)
+    x_offset = ((width - 1) - (cos * (width - 1) - sin * (height - 1))) / 2
+    y_offset = ((height - 1) - (sin * (width - 1) + cos * (height - 1))) / 2
+    zeros = tf.zeros_like(angles)
+    transforms = tf.stack([cos, -sin, x_offset, sin, cos, y_offset, zeros, zeros], axis=1)
+
+    rotated = tf.raw_ops.ImageProjectiveTransformV2(
+        images=tf.cast(images, tf.float32), transforms=transforms, output_shape=shape[1:3],
+        interpolation=interpolation.upper(), fill_mode=fill_mode.upper()
+    )
+    return tf.cast(rotated, images.dtype)
+
+
+def augment(images, seed, crop_size=None, flip=False, brightness=None, rotation=None):
+    """Random crop, horizontal flip, brightness and rotation of a batch, each one op.
+
+    Families that are None (or False) are skipped; every family that is used
+    gets its own seed split from `seed`.
+    """
+    crop_seed, flip_seed, brightness_seed, rotation_seed = _seeds(seed, 4)
+    if crop_size is not None:
+        images = random_crop(images, crop_size, crop_seed)
+    if flip:
+        images = random_flip_left_right(images, flip_seed)
+    if brightness is not None:
+        images = random_brightness(images, brightness, brightness_seed)
+    if rotation is not None:
+        images = random_rotation(images, rotation, rotation_seed)
+    return images
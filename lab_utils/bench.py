@@ -0,0 +1,136 @@
+import atexit
+import json
+import math
+import statistics
+import sys
+import time
+
+from .utils import args, logger
+
+# every bench.run() of this process, in call order
+results = []
+
+
+def percentile(values, q):
+    # linear interpolation between closest ranks (same as np.percentile's default)
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    k = (len(values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(name, times, examples=None, cpu_times=None):
+    mean = statistics.mean(times)
+    # cpu time of the whole process (all threads) per second of wall time: cores kept busy
+    cpu = statistics.mean(cpu_times) if cpu_times else None
+    return {
+        'name': name,
+        'repeats': len(times),
+        'mean': mean,
+        'std': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'min': min(times),
+        'max': max(times),
+        'p50': percentile(times, 50),
+        'p90': percentile(times, 90),
+        'p99': percentile(times, 99),
+        'examples': examples,
+        'examples_per_sec': examples / mean if examples and mean > 0 else None,
+        'cpu': cpu,
+        'cpu_util': cpu / mean if cpu is not None and mean > 0 else None,
+        'times': times,
+        'cpu_times': cpu_times,
+    }
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size to the current one (linux), so peak_rss() measures what runs next."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak resident set size of the process in MB (since the last reset_peak_rss() on linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macos, KB elsewhere
+
+
+def run(fn, name, examples=None, warmup=None, repeats=None, setup=None):
+    """Time fn() and log a summary.
+
+    Without --bench this is a single timed call, like the time.time() blocks
+    it replaces. With --bench, fn() is called `warmup` times untimed, then
+    `repeats` times timed (defaults: --warmup, --repeats), and the summary is
+    kept for the report printed at exit. fn() must block until its work is
+    done (e.g. end with .numpy()) for the timings to mean anything.
+
+    setup(), if given, is called untimed before every call of fn(), e.g. to
+    reset a model that fn() trains, so that every call does the same work
+    and what fn() leaves behind is the result of one call.
+    """
+    if not args.bench:
+        warmup, repeats = 0, 1
+    warmup = args.warmup if warmup is None else warmup
+    repeats = args.repeats if repeats is None else repeats
+
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    times, cpu_times = [], []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        fn()
+        times.append(time.perf_counter() - start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    result = summarize(name, times, examples, cpu_times)
+    if not args.bench:
+        eps = f" ({result['examples_per_sec']:.1f} examples/sec)" if result['examples_per_sec'] else ''
+        logger.info(f"{name}: {result['mean']:.2f} secs{eps}")
+        return result
+
+    msg = f"{name}: mean {result['mean']:.4f} secs, p50 {result['p50']:.4f}, p90 {result['p90']:.4f} ({repeats} runs)"
+    if result['examples_per_sec']:
+        msg += f", {result['examples_per_sec']:.1f} examples/sec"
+    if result['cpu_util'] is not None:
+        msg += f", {result['cpu_util']:.1f} cpus"
+    logger.info(msg)
+
+    if not results:
+        atexit.register(report, args.bench_out)
+    results.append(result)
+    return result
+
+
+def report(path=None):
+    if not results:
+        return
+
+    print("\n#################################################")
+    print(f"{'name':48s} {'mean':>9s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'examples/sec':>13s} {'cpus':>5s}")
+    for r in results:
+        eps = f"{r['examples_per_sec']:13.1f}" if r['examples_per_sec'] else f"{'-':>13s}"
+        cpus = f"{r['cpu_util']:5.1f}" if r.get('cpu_util') is not None else f"{'-':>5s}"
+        print(f"{r['name'][:48]:48s} {r['mean']:9.4f} {r['p50']:9.4f} {r['p90']:9.4f} {r['p99']:9.4f} {eps} {cpus}")
+
+    if path:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Benchmark results saved to {path}")
@@ -0,0 +1,188 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import re
+import shutil
+import sys
+import time
+
+from .utils import args as _args, logger, tf
+
+# args that only change how a step is shown or run, not what it computes
+IGNORED_ARGS = {
+    'verbose', 'debug', 'plot', 'log', 'step', 'all',
+    'bench', 'warmup', 'repeats', 'bench_out',
+    'cache', 'cache_dir',
+    'profile', 'profile_steps', 'profile_dir',
+    'intra_threads', 'inter_threads', 'cpus',
+}
+
+
+def step_prefixes(source):
+    """{step no: source up to (not including) the first marker of a later step}
+
+    Some labs repeat a step number; the prefix of such a step then covers all
+    of its blocks.
+    """
+    markers = [
+        (m.start(), int(m.group(1)))
+        for m in re.finditer(r'^### Step #(\d+)', source, flags=re.MULTILINE)
+    ]
+    prefixes = {}
+    for _, step in markers:
+        end = next((pos for pos, s in markers if s > step), len(source))
+        prefixes[step] = source[:end]
+    return prefixes
+
+
+def describe(value):
+    # a stable description of functions (source code) and other values for keys
+    fn = getattr(value, '__func__', value)
+    if callable(fn):
+        try:
+            return inspect.getsource(fn)
+        except (OSError, TypeError):
+            return f'{getattr(fn, "__module__", "")}.{getattr(fn, "__qualname__", type(fn).__qualname__)}'
+    return str(value)
+
+
+def fingerprint(*sources):
+    """sha1 of files and directories (path, size and mtime of every file) and values."""
+    h = hashlib.sha1()
+    for source in sources:
+        source = str(source) if isinstance(source, os.PathLike) else source
+        if isinstance(source, str) and os.path.isdir(source):
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    st = os.stat(os.path.join(dirpath, name))
+                    h.update(f'{os.path.relpath(os.path.join(dirpath, name), source)}:{st.st_size}:{int(st.st_mtime)}\n'.encode())
+        elif isinstance(source, str) and os.path.isfile(source):
+            st = os.stat(source)
+            h.update(f'{os.path.abspath(source)}:{st.st_size}:{int(st.st_mtime)}\n'.encode())
+        else:
+            h.update(json.dumps(source, sort_keys=True, default=describe).encode() + b'\n')
+    return h.hexdigest()
+
+
+class StepCache():
+    """Persist the results of lab steps across invocations.
+
+    Each entry is keyed by the lab source up to the end of the step and by the
+    lab's arguments, so editing a step (or anything before it) or changing e.g.
+    --epochs invalidates that step and every later one. Usage inside a step:
+
+        if not cache.restore(4, globals()):
+            ... compute train_df, val_df, test_df ...
+            cache.save(4, globals(), ['train_df', 'val_df', 'test_df'])
+
+    restore() also returns True, without loading anything, when a later step up
+    to the requested --step is cached: that step will restore everything needed
+    from there on. So a cached step must save all the state later steps use,
+    not only what it changed.
+
+    DataFrames, arrays and other picklable values are pickled, tf.data.Datasets
+    are stored with tf.data.experimental.save() and keras models by their
+    weights (the model must already exist in the scope to be restored).
+    Steps listed in `skip` are always recomputed (e.g. when their plots need
+    intermediate values); they are still saved for later runs. Steps listed in
+    `partial` only save what they computed themselves, so being cached does
+    not let earlier steps be skipped.
+    """
+    def __init__(self, fp, args=None, root=None, enabled=None, skip=(), partial=()):
+        args = args or _args
+        self.enabled = args.cache if enabled is None else enabled
+        self.root = os.path.join(root or args.cache_dir, os.path.splitext(os.path.basename(fp))[0])
+        self.target = None if args.all else args.step
+        self.skip = set(skip)
+        self.partial = set(partial)
+
+        params = {k: v for k, v in sorted(vars(args).items()) if k not in IGNORED_ARGS}
+        params = json.dumps(params, sort_keys=True, default=str)
+        self.keys = {}
+        for step, prefix in step_prefixes(open(fp).read()).items():
+            h = hashlib.sha1(prefix.encode('utf-8'))
+            h.update(params.encode('utf-8'))
+            self.keys[step] = h.hexdigest()[:16]
+
+    def path(self, step):
+        return os.path.join(self.root, f'step_{step:02d}-{self.keys[step]}')
+
+    def valid(self, step):
+        if step in self.skip:
+            return False
+        return step in self.keys and os.path.exists(os.path.join(self.path(step), 'manifest.json'))
+
+    def restore(self, step, scope):
+        if not self.enabled:
+            return False
+
+        if self.target is not None:
+            later = [s for s in self.keys if step < s <= self.target and s not in self.partial and self.valid(s)]
+            if later:
+                logger.debug(f'step #{step}: skipped, resuming from cached step #{max(later)}')
+                return True
+
+        if not self.valid(step):
+            return False
+
+        start = time.perf_counter()
+        path = self.path(step)
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        for name, kind in manifest['items'].items():
+            item = os.path.join(path, name)
+            if kind == 'dataset':
+                with open(item + '.spec', 'rb') as f:
+                    element_spec = pickle.load(f)
+                scope[name] = tf.data.experimental.load(item, element_spec)
+            elif kind == 'weights':
+                if not isinstance(scope.get(name), tf.keras.Model):
+                    logger.warning(f'step #{step}: model {name} must be built before restore(), recomputing')
+                    return False
+                scope[name].load_weights(os.path.join(item, 'ckpt')).expect_partial()
+            else:
+                with open(item + '.pkl', 'rb') as f:
+                    scope[name] = pickle.load(f)
+        logger.info(f'step #{step}: restored {", ".join(manifest["items"])} from cache ({time.perf_counter() - start:.2f} secs)')
+        return True
+
+    def save(self, step, scope, names):
+        if not self.enabled:
+            return
+
+        path = self.path(step)
+        tmp = f'{path}.tmp{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        items = {}
+        for name in names:
+            value = scope[name]
+            item = os.path.join(tmp, name)
+            if 'tensorflow' in sys.modules and isinstance(value, tf.data.Dataset):
+                tf.data.experimental.save(value, item)
+                with open(item + '.spec', 'wb') as f:
+                    pickle.dump(value.element_spec, f)
+                items[name] = 'dataset'
+            elif 'tensorflow' in sys.modules and isinstance(value, tf.keras.Model):
+                value.save_weights(os.path.join(item, 'ckpt'))
+                items[name] = 'weights'
+            else:
+                with open(item + '.pkl', 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                items[name] = 'pickle'
+
+        # manifest last: a step only counts as cached once everything is written
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump({'step': step, 'key': self.keys[step], 'items': items, 'created': time.time()}, f, indent=2)
+
+        # drop entries of this step with stale keys, then publish the new one
+        prefix = f'step_{step:02d}-'
+        for entry in os.listdir(self.root):
+            if entry.startswith(prefix) and '.tmp' not in entry:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        os.rename(tmp, path)
+        logger.debug(f'step #{step}: cached {", ".join(items)} in {path}')
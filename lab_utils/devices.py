@@ -0,0 +1,99 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def env_int(name, default=0):
+    value = os.environ.get(name, '')
+    return int(value) if value.strip() else default
+
+def env_flag(name, default=None):
+    # unset => default (None: leave tensorflow's own default alone)
+    value = os.environ.get(name, '').strip().lower()
+    if not value:
+        return default
+    return value not in ('0', 'false', 'no', 'off')
+
+def parse_cpus(spec):
+    # "0-3,8,10-11" => [0, 1, 2, 3, 8, 10, 11]
+    cpus = []
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def prepare(args):
+    """Settings that must be in place before tensorflow is imported."""
+    if args.cpus:
+        cpus = parse_cpus(args.cpus)
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        else:
+            logger.warning("--cpus is not supported on this platform, ignored")
+
+    if args.onednn is not None:
+        os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1' if args.onednn else '0'
+
+    # keep OpenMP (used by some oneDNN builds) in line with the intra-op pool
+    if args.intra_threads:
+        os.environ.setdefault('OMP_NUM_THREADS', str(args.intra_threads))
+
+
+def context_initialized(tf):
+    """True once the eager context exists, after which thread pools can no longer change."""
+    try:
+        from tensorflow.python.eager import context
+        return context.context()._context_handle is not None
+    except (ImportError, AttributeError):
+        return False
+
+
+def requested(args):
+    """True if any setting that configure() or prepare() applies was asked for."""
+    return bool(args.intra_threads or args.inter_threads or args.xla is not None or args.onednn is not None)
+
+
+def configure(tf, args):
+    """Settings that must be applied right after import, before any op runs."""
+    for gpu in tf.config.list_physical_devices('GPU'):
+        try:
+            tf.config.experimental.set_memory_growth(gpu, True)
+        except (RuntimeError, ValueError) as e:
+            logger.warning(f"set_memory_growth({gpu.name}) failed: {e}")
+
+    if args.intra_threads or args.inter_threads:
+        if context_initialized(tf):
+            # e.g. a lab ran ops (tfds.load, ...) before lab_utils touched tf
+            logger.warning(
+                f"tensorflow is already initialized, thread settings ignored "
+                f"(intra-op={args.intra_threads}, inter-op={args.inter_threads})"
+            )
+        else:
+            try:
+                if args.intra_threads:
+                    tf.config.threading.set_intra_op_parallelism_threads(args.intra_threads)
+                if args.inter_threads:
+                    tf.config.threading.set_inter_op_parallelism_threads(args.inter_threads)
+            except RuntimeError as e:
+                logger.warning(f"thread settings ignored: {e}")
+
+    if args.xla is not None:
+        tf.config.optimizer.set_jit(args.xla)
+
+
+def device_info(tf):
+    onednn = os.environ.get('TF_ENABLE_ONEDNN_OPTS')
+    return {
+        'cpus': [d.name for d in tf.config.list_physical_devices('CPU')],
+        'gpus': [d.name for d in tf.config.list_physical_devices('GPU')],
+        'affinity': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+        'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+        'onednn': None if onednn is None else onednn == '1',
+        'xla': bool(tf.config.optimizer.get_jit()),
+    }
@@ -0,0 +1,99 @@
+"""Preprocessed features on disk, so later runs skip decoding and feature extraction.
+
+    store = FeatureStore('speech_commands_train', train_files, get_spectrogram_and_label_id, commands)
+    spectrogram_ds = store.dataset(lambda: preprocess_dataset(train_files))
+
+The first run iterates the dataset built by build(), writes its elements as
+sharded files (tf.data.experimental.save) and serves them from there; later
+runs load them directly. An entry is keyed by the source files (path, size and
+mtime of each, in order) and by the functions and values that turn them into
+features, so changing either rebuilds it. Entries live under
+<--cache-dir>/features/<lab>, one directory per lab script, and are only
+used with --cache.
+"""
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+from .utils import args as _args, logger, tf
+from .cache import fingerprint
+
+
+def lab_name():
+    # stem of the running lab script, e.g. lab.0801.audio.simple_recognition
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+
+def _paths(files):
+    # file names of a list, array or string tensor of paths
+    if isinstance(files, tf.Tensor):
+        files = files.numpy()
+    return [f.decode('utf-8') if isinstance(f, bytes) else str(f) for f in files]
+
+
+class FeatureStore():
+    def __init__(self, name, files, *params, num_shards=8, args=None, root=None, enabled=None):
+        args = args or _args
+        self.enabled = args.cache if enabled is None else enabled
+        self.name = name
+        self.files = _paths(files)
+        self.num_shards = num_shards
+        self.key = fingerprint(*self.files, params)
+        # per lab, so that stores of different labs with the same name never evict each other
+        root = root or os.path.join(args.cache_dir, 'features', lab_name())
+        self.path = os.path.join(root, f'{name}-{self.key[:16]}')
+
+    def valid(self):
+        return os.path.exists(os.path.join(self.path, 'meta.json'))
+
+    def load(self):
+        with open(os.path.join(self.path, 'element_spec.pkl'), 'rb') as f:
+            element_spec = pickle.load(f)
+
+        # shards hold every num_shards-th element: read them round robin to keep the order
+        def reader_func(datasets):
+            return datasets.interleave(
+                lambda ds: ds, cycle_length=self.num_shards,
+                num_parallel_calls=tf.data.AUTOTUNE, deterministic=True
+            )
+
+        ds = tf.data.experimental.load(os.path.join(self.path, 'data'), element_spec, reader_func=reader_func)
+        return ds.map(lambda index, element: element)
+
+    def save(self, ds):
+        start = time.perf_counter()
+        tmp = f'{self.path}.tmp{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        ds = ds.enumerate()
+        tf.data.experimental.save(
+            ds, os.path.join(tmp, 'data'),
+            shard_func=lambda index, element: index % self.num_shards
+        )
+        with open(os.path.join(tmp, 'element_spec.pkl'), 'wb') as f:
+            pickle.dump(ds.element_spec, f)
+
+        # meta last: the entry only counts as written once the data is complete
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'name': self.name, 'key': self.key, 'files': len(self.files), 'created': time.time()}, f, indent=2)
+
+        # older entries of the same store in this lab's directory are replaced
+        prefix = f'{self.name}-'
+        root = os.path.dirname(self.path)
+        for entry in os.listdir(root):
+            if entry.startswith(prefix) and '.tmp' not in entry:
+                shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        os.rename(tmp, self.path)
+        logger.info(f'{self.name}: {len(self.files)} files preprocessed and saved to {self.path} ({time.perf_counter() - start:.2f} secs)')
+
+    def dataset(self, build):
+        """The stored dataset, or build() it, store it and serve it from disk."""
+        if not self.enabled:
+            return build()
+        if not self.valid():
+            self.save(build())
+        return self.load()
@@ -0,0 +1,249 @@
+"""Class-per-directory image trees as sharded TFRecord files of resized images.
+
+image_dataset_from_directory() (and a list_files() -> decode_jpeg ->
+resize map) opens, decodes and resizes every JPEG on every epoch of every
+run. prepare() does that once: it splits the files the way
+image_dataset_from_directory(validation_split, seed) does, decodes and
+resizes them in parallel map calls and writes the resized uint8 pixels to
+a few TFRecord shards per subset, with a manifest of the class names and
+counts. load() reads the shards back with a parallel interleave:
+
+    $ python -m lab_utils.images ~/.keras/datasets/flower_photos --out tmp/images/flower_photos --size 180 180
+
+    manifest = images.prepare(data_dir, 'tmp/images/flower_photos', image_size=(180, 180))
+    train_ds = images.load('tmp/images/flower_photos', 'training', batch_size=32)
+
+Pixels are stored rounded to uint8; image_dataset_from_directory() yields
+the unrounded float32 of the resize, so values differ by at most 0.5.
+
+decode_jpeg_resized() is a decode-and-resize for map functions that only
+decodes as many pixels as the target size needs.
+"""
+import argparse
+import json
+import os
+import time
+
+from .utils import np, tf, logger
+
+MANIFEST = 'manifest.json'
+ALLOWED_FORMATS = ('.bmp', '.gif', '.jpeg', '.jpg', '.png')
+
+
+def list_images(data_dir):
+    """(class_names, file paths, labels) in the order of image_dataset_from_directory() before shuffling."""
+    data_dir = str(data_dir)
+    class_names = sorted(
+        name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name))
+    )
+    files, labels = [], []
+    for label, name in enumerate(class_names):
+        for dirpath, dirnames, filenames in os.walk(os.path.join(data_dir, name), followlinks=True):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(ALLOWED_FORMATS):
+                    files.append(os.path.join(dirpath, filename))
+                    labels.append(label)
+    return class_names, files, labels
+
+
+def split_images(files, labels, validation_split=0.2, seed=123):
+    """{'training': (files, labels), 'validation': (files, labels)} as image_dataset_from_directory() splits them."""
+    files, labels = list(files), list(labels)
+    # the same shuffles of the paths and of the labels with the same seed
+    np.random.RandomState(seed).shuffle(files)
+    np.random.RandomState(seed).shuffle(labels)
+    if not validation_split:
+        return {'training': (files, labels)}
+    num_val = int(validation_split * len(files))
+    return {
+        'training': (files[:-num_val], labels[:-num_val]),
+        'validation': (files[-num_val:], labels[-num_val:]),
+    }
+
+
+def decode_jpeg_resized(contents, size, channels=3, crop_to_aspect_ratio=False):
+    """decode_jpeg() + resize() to `size`, decoding no more pixels than needed.
+
+    The header is read first (extract_jpeg_shape). A JPEG at least 2, 4 or 8
+    times larger than `size` on both sides is decoded at 1/2, 1/4 or 1/8
+    scale in the DCT domain (decode_jpeg's ratio), so the full-size image is
+    never materialized; with crop_to_aspect_ratio only the centered window of
+    the target aspect ratio is decoded (decode_and_crop_jpeg). Other formats
+    fall back to a full decode. Returns float32 pixels in [0, 255], like
+    tf.image.resize() of a decoded image; a downscaled decode is a smoother
+    (less aliased) source for the resize, so pixels differ slightly.
+    """
+    height, width = size
+
+    def decode_jpeg():
+        shape = tf.io.extract_jpeg_shape(contents)
+        if crop_to_aspect_ratio:
+            # largest centered window with the aspect ratio of size
+            crop_height = tf.minimum(shape[0], shape[1] * height // width)
+            crop_width = tf.minimum(shape[1], shape[0] * width // height)
+            window = tf.stack([
+                (shape[0] - crop_height) // 2, (shape[1] - crop_width) // 2, crop_height, crop_width
+            ])
+            return tf.io.decode_and_crop_jpeg(contents, window, channels=channels)
+
+        scale = tf.minimum(shape[0] // height, shape[1] // width)
+        index = tf.cast(scale >= 2, tf.int32) + tf.cast(scale >= 4, tf.int32) + tf.cast(scale >= 8, tf.int32)
+        return tf.switch_case(index, [
+            lambda ratio=ratio: tf.io.decode_jpeg(contents, channels=channels, ratio=ratio)
+            for ratio in (1, 2, 4, 8)
+        ])
+
+    def decode_image():
+        return tf.io.decode_image(contents, channels=channels, expand_animations=False)
+
+    image = tf.cond(tf.io.is_jpeg(contents), decode_jpeg, decode_image)
+    image.set_shape([None, None, channels])
+    return tf.image.resize(image, size)
+
+
+def _fingerprint(files):
+    return [(os.path.abspath(path), os.path.getsize(path), int(os.path.getmtime(path))) for path in files]
+
+
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _example(image, label):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+    })).SerializeToString()
+
+
+def write_shards(files, labels, prefix, image_size, num_shards):
+    """Decode, resize and write files round robin to num_shards TFRecord files; returns their paths."""
+    def load_image(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, image_size, method='bilinear')
+        return tf.cast(tf.round(tf.clip_by_value(image, 0, 255)), tf.uint8), label
+
+    ds = tf.data.Dataset.from_tensor_slices((files, labels))
+    ds = ds.map(load_image, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+    paths = [f'{prefix}-{i:05d}-of-{num_shards:05d}.tfrecord' for i in range(num_shards)]
+    writers = [tf.io.TFRecordWriter(path) for path in paths]
+    try:
+        for i, (image, label) in enumerate(ds.as_numpy_iterator()):
+            writers[i % num_shards].write(_example(image, int(label)))
+    finally:
+        for writer in writers:
+            writer.close()
+    return paths
+
+
+def prepare(data_dir, out_dir, image_size=(180, 180), validation_split=0.2, seed=123, num_shards=8, force=False):
+    """Write the resized images of a class-per-directory tree to out_dir.
+
+    Does nothing if out_dir already holds the result for the same files and
+    parameters.
+    """
+    class_names, files, labels = list_images(data_dir)
+    params = {
+        'files': _fingerprint(files), 'image_size': list(image_size),
+        'validation_split': validation_split, 'seed': seed, 'num_shards': num_shards,
+    }
+    manifest = read_manifest(out_dir)
+    if manifest and manifest['params'] == params and not force:
+        logger.info(f'{out_dir}: up to date ({len(files)} images)')
+        return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    for entry in os.listdir(out_dir):
+        if entry.endswith('.tfrecord') or entry == MANIFEST:
+            os.remove(os.path.join(out_dir, entry))
+
+    start = time.perf_counter()
+    subsets = {}
+    for subset, (subset_files, subset_labels) in split_images(files, labels, validation_split, seed).items():
+        shards = min(num_shards, max(1, len(subset_files)))
+        paths = write_shards(subset_files, subset_labels, os.path.join(out_dir, subset), image_size, shards)
+        counts = np.bincount(subset_labels, minlength=len(class_names))
+        subsets[subset] = {
+            'shards': [os.path.basename(path) for path in paths],
+            'count': len(subset_files),
+            'class_counts': dict(zip(class_names, counts.tolist())),
+        }
+    logger.info(f'{out_dir}: {len(files)} images in {len(class_names)} classes resized and written ({time.perf_counter() - start:.2f} secs)')
+
+    manifest = {
+        'params': params,
+        'data_dir': os.path.abspath(str(data_dir)),
+        'class_names': class_names,
+        'image_size': list(image_size),
+        'subsets': subsets,
+    }
+    # manifest last: out_dir only counts as prepared once every shard is written
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load(out_dir, subset='training', batch_size=32, shuffle=True, seed=None):
+    """(images, labels) read from prepare()'s shards: float32 (height, width, 3) images and int32 labels.
+
+    Batched like image_dataset_from_directory(), or one image at a time with
+    batch_size=None.
+    """
+    manifest = read_manifest(out_dir)
+    height, width = manifest['image_size']
+    shards = manifest['subsets'][subset]['shards']
+
+    files = tf.data.Dataset.from_tensor_slices([os.path.join(out_dir, f) for f in shards])
+    if shuffle:
+        files = files.shuffle(len(shards), seed=seed, reshuffle_each_iteration=True)
+    ds = files.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=len(shards),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle
+    )
+    if shuffle:
+        ds = ds.shuffle(1024, seed=seed, reshuffle_each_iteration=True)
+
+    feature_description = {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    }
+    # records are parsed and decoded a batch at a time
+    def parse(records):
+        examples = tf.io.parse_example(records, feature_description)
+        images = tf.reshape(tf.io.decode_raw(examples['image'], tf.uint8), [-1, height, width, 3])
+        return tf.cast(images, tf.float32), tf.cast(examples['label'], tf.int32)
+
+    ds = ds.batch(batch_size or 256).map(parse, num_parallel_calls=tf.data.AUTOTUNE)
+    if batch_size is None:
+        ds = ds.unbatch()
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m lab_utils.images')
+    ap.add_argument('data_dir', help='image tree, one directory per class')
+    ap.add_argument('--out', required=True, help='output directory')
+    ap.add_argument('--size', type=int, nargs=2, default=[180, 180], metavar=('HEIGHT', 'WIDTH'), help='image size: 180 180*')
+    ap.add_argument('--validation-split', type=float, default=0.2, help='fraction of images for validation: 0.2*')
+    ap.add_argument('--seed', type=int, default=123, help='split seed: 123*')
+    ap.add_argument('--num-shards', type=int, default=8, help='shards per subset: 8*')
+    ap.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    opts = ap.parse_args(argv)
+
+    manifest = prepare(
+        opts.data_dir, opts.out, tuple(opts.size), opts.validation_split, opts.seed, opts.num_shards, opts.force
+    )
+    for subset, info in manifest['subsets'].items():
+        logger.info(f"{subset}: {info['count']} images, {info['class_counts']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import importlib
+import logging
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+# module name => secs spent importing it (filled in on first attribute access)
+import_times = {}
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that defers the real import until the first attribute access.
+
+    `loader` is called with the module name and must return the imported module;
+    it is the place to put side effects (backend selection, device setup, ...)
+    that used to run at import time.
+    """
+    def __init__(self, name, loader=None):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_loader'] = loader or importlib.import_module
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            start = time.perf_counter()
+            module = self.__dict__['_loader'](self.__name__)
+            end = time.perf_counter()
+            self.__dict__['_module'] = module
+            import_times[self.__name__] = end - start
+            logger.info(f"Imported {self.__name__}: {end - start:.2f} secs")
+        return module
+
+    def __getattr__(self, name):
+        value = getattr(self._load(), name)
+        # cache it so that hot loops (tf.matmul, np.array, ...) skip __getattr__
+        self.__dict__[name] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self.__dict__['_module'] is None:
+            return f"<lazy module '{self.__name__}' (not loaded)>"
+        return repr(self.__dict__['_module'])
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
@@ -0,0 +1,133 @@
+import atexit
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from .utils import args, logger, tf
+
+# the header every step prints first: print("\n### Step #N - title")
+# (toc() prints the same markers without the leading newline)
+HEADER = re.compile(r'^\n### Step #(\d+)(.*)')
+
+
+class _StdoutWatcher():
+    # passes everything through to the real stdout, calling on_header() just
+    # before a step header is written
+    def __init__(self, stream, on_header):
+        self.stream = stream
+        self.on_header = on_header
+
+    def write(self, s):
+        m = HEADER.match(s)
+        if m:
+            self.on_header(int(m.group(1)), m.group(2).strip(' -'))
+        return self.stream.write(s)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class StepProfiler():
+    """Wall time, cpu time, python allocation peak and tf op counts per step.
+
+    Steps are delimited by the headers they print, so nothing in the labs has
+    to change. Time before the first step (imports, setup) is reported as
+    step 0. `trace_steps` also get a tf.profiler trace in `logdir`.
+    """
+    def __init__(self, lab, trace_steps=(), logdir='tmp/profile'):
+        self.lab = lab
+        self.trace_steps = set(trace_steps)
+        self.logdir = logdir
+        self.sections = []
+        self.current = None
+        self.tracing = False
+        self.op_counts = None # [eager, graph], once the op callback is installed
+
+    def _install_op_callback(self):
+        # tensorflow is imported lazily, so this is retried at every step
+        if self.op_counts is not None or 'tensorflow' not in sys.modules:
+            return
+        try:
+            from tensorflow.python.framework import op_callbacks
+        except ImportError:
+            logger.warning('tf op callbacks are not available, op counts disabled')
+            self.op_counts = False
+            return
+
+        counts = self.op_counts = [0, 0]
+        def count_op(op_type, inputs, attrs, outputs, op_name=None, graph=None):
+            # graph is None: op executed eagerly, else: op added to a graph (tf.function tracing)
+            counts[graph is not None] += 1
+            return None # keep the outputs as they are
+        op_callbacks.add_op_callback(count_op)
+
+    def _ops(self):
+        return tuple(self.op_counts) if self.op_counts else (0, 0)
+
+    def begin(self, step, title):
+        self.end()
+        self._install_op_callback()
+
+        if step in self.trace_steps:
+            tf.profiler.experimental.start(os.path.join(self.logdir, self.lab))
+            self.tracing = True
+
+        tracemalloc.reset_peak()
+        self.current = {
+            'lab': self.lab, 'step': step, 'title': title,
+            'wall': time.perf_counter(), 'cpu': time.process_time(), 'ops': self._ops(),
+        }
+
+    def end(self):
+        s = self.current
+        if s is None:
+            return
+        self.current = None
+
+        if self.tracing:
+            tf.profiler.experimental.stop()
+            self.tracing = False
+
+        eager, graph = self._ops()
+        s['wall'] = time.perf_counter() - s['wall']
+        s['cpu'] = time.process_time() - s['cpu']
+        s['py_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        s['eager_ops'], s['graph_ops'] = eager - s['ops'][0], graph - s['ops'][1]
+        del s['ops']
+        self.sections.append(s)
+
+    def report(self):
+        self.end()
+        if not self.sections:
+            return
+
+        print("\n#################################################")
+        print(f"{'lab':36s} {'step':>4s} {'wall':>9s} {'cpu':>9s} {'cpu%':>6s} {'py peak(MB)':>11s} {'eager ops':>10s} {'graph ops':>10s}  title")
+        for s in sorted(self.sections, key=lambda s: -s['wall']):
+            cpu_pct = 100 * s['cpu'] / s['wall'] if s['wall'] > 0 else 0
+            print(
+                f"{s['lab'][:36]:36s} {s['step']:4d} {s['wall']:9.3f} {s['cpu']:9.3f} {cpu_pct:6.0f} "
+                f"{s['py_peak_mb']:11.1f} {s['eager_ops']:10d} {s['graph_ops']:10d}  {s['title']}"
+            )
+
+        os.makedirs(self.logdir, exist_ok=True)
+        path = os.path.join(self.logdir, self.lab + '.json')
+        with open(path, 'w') as f:
+            json.dump(self.sections, f, indent=2)
+        logger.info(f'Profile saved to {path}' + (f' (traces in {os.path.join(self.logdir, self.lab)})' if self.trace_steps else ''))
+
+
+def start():
+    """Profile the running lab (--profile); the summary is printed at exit."""
+    lab = os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'interactive'
+    trace_steps = [int(s) for s in args.profile_steps.split(',') if s.strip()]
+    profiler = StepProfiler(lab, trace_steps, args.profile_dir)
+
+    tracemalloc.start()
+    profiler.begin(0, 'setup')
+    sys.stdout = _StdoutWatcher(sys.stdout, profiler.begin)
+    atexit.register(profiler.report)
+    return profiler
@@ -0,0 +1,210 @@
+"""Run every lab in parallel worker processes and report how each one went.
+
+    $ python -m lab_utils.runner -j 8 --threads 4 --timeout 1800 -- --epochs 1
+    $ python -m lab_utils.runner tf2/tutorial --report tmp/runner/report.json
+
+Each lab is started as `python <lab> --all <lab args>` from the repository
+root. A job gets a CPU-thread budget through the LAB_* variables read by
+lab_utils (and, with --pin, its own slice of cpus), so concurrent labs do not
+oversubscribe the box. Wall time and peak RSS are collected per lab and per
+step (from the `### Step #N` lines the labs print).
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import logger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# a step header is printed as "\n### Step #N - title"; toc() prints the same
+# markers without the blank line before them
+STEP_PATTERN = re.compile(r'^### Step #(\d+)(.*)')
+
+
+def discover(paths=('tf2', 'text')):
+    labs = []
+    for path in paths:
+        if not os.path.exists(path):
+            path = os.path.join(ROOT, path)
+        if os.path.isfile(path):
+            labs.append(path)
+        else:
+            labs.extend(glob.glob(os.path.join(path, '**', 'lab.*.py'), recursive=True))
+    return sorted(os.path.relpath(os.path.abspath(lab), ROOT) for lab in set(labs))
+
+
+def peak_rss_mb(pid):
+    # VmHWM: peak resident set size of the process so far (linux only)
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_lab(lab, lab_args, threads, cpus=None, timeout=None, log_dir=None):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONUNBUFFERED': '1', # step lines must arrive when they are printed
+        'MPLBACKEND': 'Agg',
+        'LAB_INTRA_THREADS': str(threads),
+        'LAB_INTER_THREADS': str(max(1, threads // 2)),
+        'OMP_NUM_THREADS': str(threads),
+    })
+    if cpus:
+        env['LAB_CPUS'] = ','.join(map(str, cpus))
+
+    log = None
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        log = open(os.path.join(log_dir, os.path.basename(lab)[:-3] + '.log'), 'w')
+
+    steps = []
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, lab, '--all'] + lab_args, cwd=ROOT, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+    )
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        proc.kill()
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+
+    def close_step(now):
+        if steps:
+            steps[-1]['wall'] = now - steps[-1].pop('start')
+            steps[-1]['peak_rss_mb'] = peak_rss_mb(proc.pid)
+
+    try:
+        prev = None
+        for line in proc.stdout:
+            if log:
+                log.write(line)
+            m = STEP_PATTERN.match(line)
+            blank_before, prev = prev == '\n', line
+            if m and blank_before:
+                now = time.perf_counter()
+                close_step(now)
+                steps.append({'step': int(m.group(1)), 'title': m.group(2).strip(' -\n'), 'start': now})
+        # wait4() instead of wait(): it also gives us this child's own max rss
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        if timer:
+            timer.cancel()
+        if log:
+            log.close()
+    end = time.perf_counter()
+
+    close_step(end)
+    peak = rusage.ru_maxrss / 1024 # kB on linux
+    if steps:
+        steps[-1]['peak_rss_mb'] = peak
+
+    status = 'ok' if proc.returncode == 0 else 'timeout' if timed_out.is_set() else 'failed'
+    return {
+        'lab': lab,
+        'status': status,
+        'returncode': proc.returncode,
+        'failed_step': steps[-1]['step'] if status != 'ok' and steps else None,
+        'wall': end - start,
+        'peak_rss_mb': peak,
+        'threads': threads,
+        'cpus': cpus,
+        'steps': steps,
+    }
+
+
+def run_all(labs, lab_args=(), jobs=None, threads=None, pin=False, timeout=None, log_dir=None):
+    ncpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    jobs = jobs or max(1, ncpus // (threads or 1))
+    threads = threads or max(1, ncpus // jobs)
+
+    # one cpu slice per worker slot; a job takes a free slot, so no two running labs share cpus
+    slots = queue.Queue()
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(ncpus))
+    for i in range(jobs):
+        slots.put(cpus[i*threads:(i+1)*threads] if pin and (i+1)*threads <= len(cpus) else None)
+
+    logger.info(f'{len(labs)} labs, {jobs} jobs x {threads} threads{" (pinned)" if pin else ""}')
+
+    def job(lab):
+        slot = slots.get()
+        try:
+            result = run_lab(lab, list(lab_args), threads, slot, timeout, log_dir)
+        finally:
+            slots.put(slot)
+        logger.info(f"{result['status']:7s} {result['wall']:8.1f} secs {result['peak_rss_mb']:8.0f} MB  {lab}")
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(job, labs))
+
+    return {
+        'jobs': jobs,
+        'threads': threads,
+        'pinned': pin,
+        'lab_args': list(lab_args),
+        'wall': time.perf_counter() - start,
+        'summary': {s: sum(r['status'] == s for r in results) for s in ('ok', 'failed', 'timeout')},
+        'labs': results,
+    }
+
+
+def print_report(report):
+    print("\n#################################################")
+    print(f"{'status':8s} {'wall':>9s} {'rss(MB)':>9s}  lab")
+    for r in sorted(report['labs'], key=lambda r: -r['wall']):
+        failed = f" (step #{r['failed_step']})" if r['failed_step'] else ''
+        print(f"{r['status']:8s} {r['wall']:9.1f} {r['peak_rss_mb']:9.0f}  {r['lab']}{failed}")
+    print(f"\n{report['summary']} in {report['wall']:.1f} secs")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m lab_utils.runner')
+    ap.add_argument('paths', nargs='*', default=['tf2', 'text'], help='lab files or directories: tf2 text*')
+    ap.add_argument('-j', '--jobs', type=int, default=0, help='concurrent labs: cpus/threads*')
+    ap.add_argument('--threads', type=int, default=0, help='cpu threads per lab: cpus/jobs*')
+    ap.add_argument('--pin', action='store_true', help='pin each job to its own cpus')
+    ap.add_argument('--timeout', type=float, default=0, help='secs per lab: 0*(none)')
+    ap.add_argument('--report', default='tmp/runner/report.json', help='json report: tmp/runner/report.json*')
+    ap.add_argument('--logs', default='tmp/runner/logs', help='per-lab output: tmp/runner/logs*')
+    argv = sys.argv[1:] if argv is None else argv
+    # everything after `--` is passed to each lab
+    lab_args = argv[argv.index('--')+1:] if '--' in argv else []
+    argv = argv[:argv.index('--')] if '--' in argv else argv
+    opts = ap.parse_args(argv)
+
+    labs = discover(opts.paths)
+    report = run_all(
+        labs, lab_args, jobs=opts.jobs, threads=opts.threads, pin=opts.pin,
+        timeout=opts.timeout or None, log_dir=opts.logs
+    )
+    print_report(report)
+
+    if opts.report:
+        os.makedirs(os.path.dirname(opts.report) or '.', exist_ok=True)
+        with open(opts.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f'Report saved to {opts.report}')
+
+    return 0 if report['summary']['ok'] == len(labs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
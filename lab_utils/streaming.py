@@ -0,0 +1,85 @@
+"""Frame-level audio classifiers run on a live stream, chunk by chunk.
+
+    classifier = StreamingClassifier(frame_scores, frame_length=15600, frame_step=7680, window=10)
+    for chunk in chunks:
+        scores = classifier.push(chunk) # running class scores, or None before the first frame
+
+frame_scores(samples) maps the samples of n consecutive frames (n-1 frame
+steps plus one frame length, e.g. what YAMNet reads for n frames) to their
+(n, classes) scores. A chunk is appended to a buffer of the samples not yet
+covered by a frame; every frame that is complete is scored in one call and
+the buffer is trimmed to the samples after it. The running scores are the
+mean of the scores of the last `window` frames. The buffer never holds more
+than a frame plus a chunk and the window at most `window` frames, so memory
+and the work per chunk are bounded however long the stream is.
+
+replay() feeds a recorded waveform chunk by chunk, as if it were live, and
+reports the real-time factor and the latency percentiles of the chunks.
+"""
+import collections
+import time
+
+from .utils import np
+from .bench import percentile
+from .timeseries import num_windows
+
+
+class StreamingClassifier():
+    def __init__(self, frame_scores, frame_length, frame_step, window=10):
+        self.frame_scores = frame_scores
+        self.frame_length = frame_length
+        self.frame_step = frame_step
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.frames = collections.deque(maxlen=self.window)
+        self.num_frames = 0
+
+    def push(self, chunk):
+        """Running class scores after the samples of chunk (None until the first frame is complete)."""
+        self.buffer = np.concatenate([self.buffer, np.asarray(chunk, dtype=np.float32).reshape(-1)])
+        n = num_windows(len(self.buffer), self.frame_length, self.frame_step)
+        if n:
+            samples = self.buffer[:(n - 1) * self.frame_step + self.frame_length]
+            self.frames.extend(np.asarray(self.frame_scores(samples)))
+            self.buffer = self.buffer[n * self.frame_step:]
+            self.num_frames += n
+        return self.scores()
+
+    def scores(self):
+        if not self.frames:
+            return None
+        return np.mean(self.frames, axis=0)
+
+
+def replay(classifier, waveform, chunk_size, rate=16000):
+    """Stream waveform through classifier in chunks of chunk_size samples.
+
+    Returns the running scores after every chunk and the timings: the
+    real-time factor (processing time / audio duration, < 1 keeps up with
+    live audio) and the percentiles of the per-chunk latency in seconds.
+    """
+    waveform = np.asarray(waveform, dtype=np.float32)
+    classifier.reset()
+
+    scores, latencies = [], []
+    for i in range(0, len(waveform), chunk_size):
+        start = time.perf_counter()
+        scores.append(classifier.push(waveform[i:i+chunk_size]))
+        latencies.append(time.perf_counter() - start)
+
+    duration = len(waveform) / rate
+    return {
+        'scores': scores,
+        'chunks': len(latencies),
+        'frames': classifier.num_frames,
+        'duration': duration,
+        'rtf': sum(latencies) / duration if duration else None,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+        'chunk_duration': chunk_size / rate,
+    }
@@ -0,0 +1,175 @@
+"""Sliding windows over a time series without materializing them.
+
+timeseries_dataset_from_array() slices every window out of the data one by
+one. Here a split is held once, as a single contiguous float32 buffer shared
+by every window generator that uses it, and a window is only a start index:
+the windows of a batch are gathered from the buffer when the batch is built.
+
+SeriesStore keeps normalized splits in a memory-mapped file, so windows can
+also be gathered straight from disk for series larger than memory.
+"""
+import json
+import os
+import shutil
+import time
+import weakref
+
+from .utils import np, tf, logger
+
+# id(data) -> float32 tensor of data, for as long as data is alive
+_buffers = {}
+
+
+def as_array(data):
+    """data as a C-contiguous float32 array (no copy if it already is one)."""
+    return np.ascontiguousarray(data, dtype=np.float32)
+
+
+def as_buffer(data):
+    """The float32 tensor of data, created once per data object.
+
+    Only weak-referenceable data (arrays, DataFrames, ...) is cached: the
+    entry is dropped when data is collected, before its id can be reused.
+    Anything else (e.g. a list) gets a new tensor on every call.
+    """
+    key = id(data)
+    if key not in _buffers:
+        buffer = tf.constant(as_array(data))
+        try:
+            weakref.finalize(data, _buffers.pop, key, None)
+        except TypeError: # not weak-referenceable: its id may outlive it
+            return buffer
+        _buffers[key] = buffer
+    return _buffers[key]
+
+
+def sliding_windows(data, window_size, stride=1):
+    """(num_windows, window_size, features) read-only strided view of data (no copy)."""
+    array = as_array(data)
+    windows = np.lib.stride_tricks.sliding_window_view(array, window_size, axis=0)[::stride]
+    return windows.transpose(0, 2, 1) # sliding_window_view puts the window axis last
+
+
+def num_windows(length, window_size, stride=1):
+    return max(0, (length - window_size) // stride + 1)
+
+
+def window_dataset(data, window_size, batch_size=32, stride=1, shuffle=False, seed=None):
+    """Batches of (batch, window_size, features) windows of data.
+
+    The same windows, in the same order and batching, as
+    timeseries_dataset_from_array(data, None, window_size, sequence_stride=stride,
+    shuffle=shuffle, batch_size=batch_size).
+    """
+    n = num_windows(len(data), window_size, stride)
+    ds = tf.data.Dataset.range(n)
+    if shuffle:
+        ds = ds.shuffle(n, seed=seed)
+
+    if isinstance(data, np.memmap):
+        # read each batch from the mapped file; only the pages it touches are loaded
+        offsets = np.arange(window_size)
+        def gather_windows(index):
+            return np.asarray(data[(index * stride)[:, np.newaxis] + offsets], dtype=np.float32)
+
+        def gather(index):
+            windows = tf.numpy_function(gather_windows, [index], tf.float32)
+            windows.set_shape([None, window_size, data.shape[1]])
+            return windows
+    else:
+        buffer = as_buffer(data)
+        offsets = tf.range(window_size, dtype=tf.int64)
+        def gather(index):
+            starts = index * stride # (batch,)
+            return tf.gather(buffer, starts[:, tf.newaxis] + offsets) # (batch, window_size, features)
+
+    return ds.batch(batch_size).map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+class SeriesStore():
+    """Normalized splits of a multi-column series in one memory-mapped file.
+
+    A directory with values.npy, the rows of all splits one after the other as
+    row-major float32 (a window reads consecutive rows of every column), and
+    meta.json with the column names, the row range of each split and the
+    normalization stats. Usage:
+
+        store = SeriesStore('tmp/jena/<key>')
+        if not store.valid():
+            store.write({'train': train_df, 'val': val_df, 'test': test_df}, columns, mean, std)
+        train = store.split('train') # np.memmap, nothing is read yet
+    """
+    def __init__(self, path):
+        self.path = path
+        self.meta = None
+        self.values = None
+
+    def valid(self):
+        return os.path.exists(os.path.join(self.path, 'meta.json'))
+
+    def write(self, splits, columns, mean, std, chunk_size=65536):
+        start = time.perf_counter()
+        tmp = f'{self.path}.tmp{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        rows = sum(len(data) for data in splits.values())
+        values = np.lib.format.open_memmap(
+            os.path.join(tmp, 'values.npy'), mode='w+', dtype=np.float32, shape=(rows, len(columns))
+        )
+        ranges, offset = {}, 0
+        for name, data in splits.items():
+            # chunk by chunk, so the source never has to be copied as a whole
+            for i in range(0, len(data), chunk_size):
+                chunk = as_array(data[i:i+chunk_size])
+                values[offset+i:offset+i+len(chunk)] = chunk
+            ranges[name] = [offset, offset + len(data)]
+            offset += len(data)
+        values.flush()
+        del values
+
+        # meta last: the store only counts as written once the values are complete
+        meta = {
+            'columns': list(columns), 'splits': ranges, 'rows': rows,
+            'mean': [float(x) for x in mean], 'std': [float(x) for x in std],
+            'created': time.time(),
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        os.rename(tmp, self.path)
+        logger.info(f'{self.path}: wrote {rows} x {len(columns)} values ({time.perf_counter() - start:.2f} secs)')
+        return self.open()
+
+    def open(self):
+        if self.values is None:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                self.meta = json.load(f)
+            self.values = np.load(os.path.join(self.path, 'values.npy'), mmap_mode='r')
+        return self
+
+    @property
+    def columns(self):
+        return self.open().meta['columns']
+
+    @property
+    def column_indices(self):
+        return {name: i for i, name in enumerate(self.columns)}
+
+    def split(self, name):
+        """Rows of a split as a read-only np.memmap."""
+        start, end = self.open().meta['splits'][name]
+        return self.values[start:end]
+
+    def stats(self, column=None):
+        # (mean, std) of every column, or of one column by name
+        meta = self.open().meta
+        if column is None:
+            return np.array(meta['mean']), np.array(meta['std'])
+        i = self.column_indices[column]
+        return meta['mean'][i], meta['std'][i]
+
+    def denormalize(self, values, column=None):
+        mean, std = self.stats(column)
+        return np.asarray(values) * std + mean
@@ -6,6 +6,10 @@ logger.info("Started...")
 
 # cli
 import argparse
+import os
+import sys
+from . import devices
+from .devices import env_int, env_flag
 class BooleanAction(argparse.Action):
     def __init__(self, option_strings, dest, nargs=None, **kwargs):
         super(BooleanAction, self).__init__(option_strings, dest, nargs=0, **kwargs)
@@ -23,6 +27,24 @@ ap.add_argument('--task', type=int, default=0, help='task no: 0*')
 ap.add_argument('--step', type=int, default=0, help='step no: 0*') 
 # ap.add_argument('--steps', default="", help='steps to execute')
 ap.add_argument('--all', '--no-all', dest='all', default=False, action=BooleanAction, help='execute all the steps: F*') 
+# devices and threading (see devices.py); defaults can also come from LAB_* environment variables
+ap.add_argument('--intra-threads', type=int, default=env_int('LAB_INTRA_THREADS'), help='intra-op threads: 0*(tf default)')
+ap.add_argument('--inter-threads', type=int, default=env_int('LAB_INTER_THREADS'), help='inter-op threads: 0*(tf default)')
+ap.add_argument('--cpus', default=os.environ.get('LAB_CPUS', ''), help='pin the process to cpus, e.g. 0-7,16: ""*')
+ap.add_argument('--onednn', '--no-onednn', dest='onednn', default=env_flag('LAB_ONEDNN'), action=BooleanAction, help='oneDNN optimizations: tf default*')
+ap.add_argument('--xla', '--no-xla', dest='xla', default=env_flag('LAB_XLA'), action=BooleanAction, help='XLA auto-clustering: tf default*')
+# benchmarking (see bench.py)
+ap.add_argument('--bench', '--no-bench', dest='bench', default=False, action=BooleanAction, help='benchmark mode: F*')
+ap.add_argument('--warmup', type=int, default=1, help='bench: untimed warmup runs: 1*')
+ap.add_argument('--repeats', type=int, default=5, help='bench: timed runs: 5*')
+ap.add_argument('--bench-out', default='', help='bench: save results as json to this path: ""*')
+# step results cache (see cache.py)
+ap.add_argument('--cache', '--no-cache', dest='cache', default=env_flag('LAB_CACHE', False), action=BooleanAction, help='cache step results on disk: F*')
+ap.add_argument('--cache-dir', default=os.environ.get('LAB_CACHE_DIR', 'tmp/step_cache'), help='step cache directory: tmp/step_cache*')
+# per-step profiling (see profiling.py)
+ap.add_argument('--profile', '--no-profile', dest='profile', default=False, action=BooleanAction, help='profile each step: F*')
+ap.add_argument('--profile-steps', default='', help='profile: tf.profiler trace for these steps, e.g. 3,5: ""*')
+ap.add_argument('--profile-dir', default='tmp/profile', help='profile: json summary and traces: tmp/profile*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -30,25 +52,51 @@ logger.info(args)
 if args.verbose:
     logger.setLevel(logging.DEBUG)
 
-import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = str(args.log)
+# done here rather than in _load_tensorflow(): labs may import tensorflow.keras directly
+devices.prepare(args)
+
+from .lazy import LazyModule, import_times
+
+# numpy, matplotlib and tensorflow are imported on first use (see lazy.py),
+# so that TOC-only and argument-parsing runs do not pay for them.
+def _load_numpy(name):
+    import numpy as np
+    np.set_printoptions(precision=3, suppress=True)
+    return np
 
-import numpy as np
-np.set_printoptions(precision=3, suppress=True)
+def _load_pyplot(name):
+    import matplotlib as mp
+    if args.plot:
+        mp.use('TkAgg')
+    import matplotlib.pyplot as plt
+    return plt
 
-import matplotlib as mp
-if args.plot:
-    mp.use('TkAgg')
-import matplotlib.pyplot as plt
+def _load_tensorflow(name):
+    import tensorflow as tf
+    devices.configure(tf, args)
 
-import tensorflow as tf
-physical_devices = tf.config.list_physical_devices('GPU')
-tf.config.experimental.set_memory_growth(physical_devices[0], True)
+    info = devices.device_info(tf)
+    print("\n#################################################")
+    print("Version: ", tf.__version__)
+    print("Eager mode: ", tf.executing_eagerly())
+    print("GPU is", "available" if info['gpus'] else "NOT AVAILABLE")
+    print(f"Threads: intra-op={info['intra_op_threads'] or 'auto'}, inter-op={info['inter_op_threads'] or 'auto'}")
+    return tf
+
+def device_info():
+    return devices.device_info(tf)
 
-print("\n#################################################")
-print("Version: ", tf.__version__)
-print("Eager mode: ", tf.executing_eagerly())
-print("GPU is", "available" if tf.config.list_physical_devices("GPU") else "NOT AVAILABLE")
+np = LazyModule('numpy', _load_numpy)
+plt = LazyModule('matplotlib.pyplot', _load_pyplot)
+tf = LazyModule('tensorflow', _load_tensorflow)
+
+# thread pools can only be set before the first op runs, and many labs run ops
+# through their own imports (tfds.load, keras, ...) before they touch `tf`:
+# with threading/xla/onednn settings, tensorflow is loaded and configured now,
+# ahead of the lab's imports (TOC-only runs stay lazy)
+if devices.requested(args) and (args.step or args.all):
+    tf._load()
 
 def debug():
     pass
@@ -59,10 +107,18 @@ def toc(fp):
     matching_lines = [line for line in open(fp) if re.match(pattern, line)]
     print("\n#################################################")
     print(*matching_lines, sep="")
+    # a TOC-only run ends here: labs print the TOC before their own imports
+    # (tensorflow.keras, tfds, hub, ...), which it never needs
+    if not args.all:
+        sys.exit()
 
 def auto_increment(step, flag=False):
     if flag:
         step = step + 1
     return step
 
+if args.profile:
+    from . import profiling
+    profiling.start()
+
 
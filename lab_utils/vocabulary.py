@@ -0,0 +1,141 @@
+"""Vocabularies counted in batches inside the tf.data graph, and kept on disk.
+
+Replaces iterating a tokenized dataset token by token in Python: every batch
+is reduced to its distinct tokens and their counts by tf.unique_with_counts
+(in parallel map calls), so Python only merges one (token, count) pair per
+distinct token per batch.
+
+VocabStore saves adapted vocabularies (with --cache) so that later runs load
+them instead of making another pass over the corpus.
+"""
+import collections
+import heapq
+import json
+import os
+import time
+
+from .utils import args as _args, logger, tf
+from .cache import fingerprint
+
+
+def count_tokens(tokenized_ds, batch_size=1024, capacity=None):
+    """Counter of the tokens in a dataset of 1-D string tensors.
+
+    With `capacity`, at most 2 x capacity tokens are tracked: whenever there
+    are more, only the `capacity` most frequent are kept. Counts of frequent
+    tokens stay exact as long as they are never pruned, which is the case for
+    a top-k vocabulary much smaller than capacity.
+    """
+    def unique_with_counts(tokens):
+        return tf.unique_with_counts(tokens.flat_values)[::2] # (tokens, counts)
+
+    ds = tokenized_ds.apply(tf.data.experimental.dense_to_ragged_batch(batch_size))
+    ds = ds.map(unique_with_counts, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+
+    counts = collections.Counter()
+    for tokens, n in ds.prefetch(tf.data.AUTOTUNE).as_numpy_iterator():
+        counts.update(dict(zip(tokens, n.tolist())))
+        if capacity and len(counts) > 2 * capacity:
+            counts = collections.Counter(dict(counts.most_common(capacity)))
+    return counts
+
+
+def build_vocab(tokenized_ds, max_tokens, batch_size=1024, capacity=None):
+    """The `max_tokens` most frequent tokens, most frequent first.
+
+    Ties keep the order in which tokens were first seen, the same as sorting a
+    per-token count dict by count.
+    """
+    counts = count_tokens(tokenized_ds, batch_size, capacity)
+    return [token for token, _ in heapq.nlargest(max_tokens, counts.items(), key=lambda x: x[1])]
+
+
+def lookup_table(vocab, num_oov_buckets=1, offset=2):
+    """StaticVocabularyTable: vocab[i] -> i + offset (0: padding, 1: OOV by default)."""
+    init = tf.lookup.KeyValueTensorInitializer(
+        vocab, tf.range(offset, len(vocab) + offset, dtype=tf.int64),
+        key_dtype=tf.string, value_dtype=tf.int64
+    )
+    return tf.lookup.StaticVocabularyTable(init, num_oov_buckets)
+
+
+class VocabStore():
+    """Adapted vocabularies on disk, keyed by where the data came from and how it was standardized.
+
+    The caller names the data `sources`: files or directories (fingerprinted
+    by path, size and mtime) and any values that select the data, e.g. the
+    split and seed of text_dataset_from_directory(). Usage:
+
+        store = VocabStore()
+        store.adapt(vectorize_layer, train_text, sources=[train_dir, 'training', seed])
+        vocab = store.get('illiad', lambda: build_vocab(tokenized_ds, VOCAB_SIZE), sources=[...])
+
+    Entries live under <--cache-dir>/vocab and are only used with --cache.
+    """
+    def __init__(self, args=None, root=None, enabled=None):
+        args = args or _args
+        self.enabled = args.cache if enabled is None else enabled
+        self.root = root or os.path.join(args.cache_dir, 'vocab')
+
+    def path(self, name, key):
+        return os.path.join(self.root, f'{name}-{key[:16]}.json')
+
+    def load(self, name, key):
+        path = self.path(name, key)
+        if not self.enabled or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        vocab = entry['vocab']
+        return [token.encode('utf-8') for token in vocab] if entry['bytes'] else vocab
+
+    def save(self, name, key, vocab, **info):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        is_bytes = any(isinstance(token, bytes) for token in vocab)
+        entry = {
+            'name': name, 'key': key, 'created': time.time(), 'bytes': is_bytes, **info,
+            'vocab': [token.decode('utf-8') if isinstance(token, bytes) else token for token in vocab],
+        }
+        path = self.path(name, key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(entry, f)
+        os.replace(path + '.tmp', path)
+
+    def get(self, name, build, sources=(), **params):
+        """The stored vocabulary for (sources, params), or build() and store it."""
+        key = fingerprint(*sources, params)
+        start = time.perf_counter()
+        vocab = self.load(name, key)
+        if vocab is not None:
+            logger.info(f'{name}: loaded {len(vocab)} tokens from the vocabulary store ({time.perf_counter() - start:.2f} secs)')
+            return vocab
+
+        vocab = build()
+        self.save(name, key, vocab)
+        return vocab
+
+    def adapt(self, layer, data, sources=(), name=None):
+        """layer.adapt(data), unless the vocabulary of the same layer config and data is stored.
+
+        The key covers the layer config (standardize and split functions by
+        their source code) except its name. Only the vocabulary is stored, so
+        layers with output_mode='tf-idf' are always adapted.
+        """
+        config = {k: v for k, v in layer.get_config().items() if k not in ('name', 'vocabulary')}
+        name = name or type(layer).__name__.lower()
+        if config.get('output_mode') == 'tf-idf':
+            layer.adapt(data)
+            return layer
+
+        adapted = []
+        def build():
+            layer.adapt(data)
+            adapted.append(True)
+            return layer.get_vocabulary()
+
+        vocab = self.get(name, build, sources, config=config)
+        if not adapted:
+            layer.set_vocabulary(vocab)
+        return layer
@@ -0,0 +1,348 @@
+"""Vectorized word2vec training data (skip-grams + negative sampling).
+
+Produces the same kind of examples as tf.keras.preprocessing.sequence.skipgrams
+followed by tf.random.log_uniform_candidate_sampler per positive pair (see
+lab.0702), but for a whole (N, sequence_length) array of token ids at once.
+
+For corpora too large to redo that on every run, prepare() shards the text
+files, counts the vocabulary and writes the examples as sharded TFRecord files
+in worker processes; load_examples() reads them back:
+
+    $ python -m lab_utils.word2vec corpus/*.txt --out tmp/word2vec/corpus --workers 16
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import string
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .utils import np, tf, logger
+
+
+def log_uniform_sample(rng, range_max, shape):
+    # P(k) = (log(k+2) - log(k+1)) / log(range_max+1), as in tf.random.log_uniform_candidate_sampler
+    u = rng.random(shape)
+    samples = np.exp(u * np.log(range_max + 1)) - 1
+    return np.minimum(samples.astype(np.int64), range_max - 1)
+
+
+def negative_samples(rng, n, num_ns, range_max):
+    """(n, num_ns) log-uniform samples, unique within each row (unique=True)."""
+    if num_ns > range_max:
+        raise ValueError(f'cannot draw {num_ns} unique samples from {range_max} classes')
+    ns = log_uniform_sample(rng, range_max, (n, num_ns))
+    while True:
+        s = np.sort(ns, axis=1)
+        dup = (s[:, 1:] == s[:, :-1]).any(axis=1)
+        if not dup.any():
+            return ns
+        ns[dup] = log_uniform_sample(rng, range_max, (int(dup.sum()), num_ns))
+
+
+def skipgram_pairs(sequences, window_size, sampling_table=None, rng=None):
+    """Positive (target, context) pairs of every sequence.
+
+    sequences: (N, L) token ids, 0 is padding. A target position is dropped
+    with probability 1 - sampling_table[id], like keras' skipgrams().
+    """
+    seqs = np.asarray(sequences, dtype=np.int64)
+    keep = seqs != 0
+    if sampling_table is not None:
+        keep &= rng.random(seqs.shape) < sampling_table[seqs]
+
+    targets, contexts = [], []
+    length = seqs.shape[1]
+    # one vectorized pass per window offset instead of one per word
+    for d in range(-window_size, window_size + 1):
+        if d == 0 or abs(d) >= length:
+            continue
+        if d > 0:
+            t, c, k = seqs[:, :-d], seqs[:, d:], keep[:, :-d]
+        else:
+            t, c, k = seqs[:, -d:], seqs[:, :d], keep[:, -d:]
+        m = k & (c != 0)
+        targets.append(t[m])
+        contexts.append(c[m])
+    if not targets: # no window offset fits in the sequences (length 1 or window_size 0)
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(targets), np.concatenate(contexts)
+
+
+def generate_training_data(sequences, window_size, num_ns, vocab_size, seed=None, sampling_table='auto', rng=None):
+    """(targets, contexts, labels): (n,), (n, num_ns+1), (n, num_ns+1) int64
+
+    contexts[:, 0] is the positive context word (label 1), the rest are
+    negative samples (label 0). sampling_table: 'auto' subsamples frequent
+    words with make_sampling_table(vocab_size), None keeps every target.
+    """
+    rng = rng or np.random.default_rng(seed)
+    if isinstance(sampling_table, str) and sampling_table == 'auto':
+        sampling_table = tf.keras.preprocessing.sequence.make_sampling_table(vocab_size)
+
+    targets, positives = skipgram_pairs(sequences, window_size, sampling_table, rng)
+    negatives = negative_samples(rng, len(targets), num_ns, vocab_size)
+    contexts = np.concatenate([positives[:, np.newaxis], negatives], axis=1)
+    labels = np.zeros_like(contexts)
+    labels[:, 0] = 1
+    return targets, contexts, labels
+
+
+def training_batches(sequences, window_size, num_ns, vocab_size, batch_size, chunk_size=8192, seed=None):
+    """Yield shuffled ((targets, contexts), labels) batches, chunk_size sequences at a time.
+
+    Only one chunk of examples is in memory at a time; the last incomplete
+    batch is dropped.
+    """
+    rng = np.random.default_rng(seed)
+    sampling_table = tf.keras.preprocessing.sequence.make_sampling_table(vocab_size)
+
+    rest = None
+    for start in range(0, len(sequences), chunk_size):
+        chunk = generate_training_data(
+            sequences[start:start+chunk_size], window_size, num_ns, vocab_size,
+            sampling_table=sampling_table, rng=rng
+        )
+        order = rng.permutation(len(chunk[0]))
+        chunk = [a[order] for a in chunk]
+        if rest is not None:
+            chunk = [np.concatenate([r, a]) for r, a in zip(rest, chunk)]
+
+        n = len(chunk[0]) // batch_size * batch_size
+        for i in range(0, n, batch_size):
+            targets, contexts, labels = (a[i:i+batch_size] for a in chunk)
+            yield (targets, contexts), labels
+        rest = [a[n:] for a in chunk]
+
+
+def make_dataset(sequences, window_size, num_ns, vocab_size, batch_size, chunk_size=8192, seed=None):
+    """tf.data pipeline streaming training_batches()."""
+    signature = (
+        (tf.TensorSpec((batch_size,), tf.int64), tf.TensorSpec((batch_size, num_ns + 1), tf.int64)),
+        tf.TensorSpec((batch_size, num_ns + 1), tf.int64),
+    )
+    ds = tf.data.Dataset.from_generator(
+        lambda: training_batches(sequences, window_size, num_ns, vocab_size, batch_size, chunk_size, seed),
+        output_signature=signature
+    )
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+### sharded preprocessing
+
+MANIFEST = 'manifest.json'
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+
+def standardize(line):
+    # same as lab.0702's custom_standardization(): lowercase, no punctuation
+    return line.lower().translate(_PUNCTUATION).split()
+
+
+def split_files(files, num_shards):
+    """[(path, start, end)]: byte ranges of about the same size over all files."""
+    sizes = [os.path.getsize(path) for path in files]
+    target = max(1, sum(sizes) / num_shards)
+    shards = []
+    for path, size in zip(files, sizes):
+        n = max(1, round(size / target))
+        bounds = [size * i // n for i in range(n + 1)]
+        shards.extend((path, a, b) for a, b in zip(bounds, bounds[1:]))
+    return shards
+
+
+def read_lines(path, start, end):
+    # the non-empty lines that start within [start, end)
+    with open(path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline() # move to the first line starting at or after `start`
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            if line:
+                yield line
+
+
+def _count_shard(shard):
+    counts = collections.Counter()
+    for line in read_lines(*shard):
+        counts.update(standardize(line))
+    return counts
+
+
+def _write_shard(task):
+    shard, path, vocab, params, seed = task
+    ids = {token: i for i, token in enumerate(vocab)}
+    length = params['sequence_length']
+
+    # vectorize like TextVectorization(output_sequence_length=...): 1 is OOV, 0 is padding
+    sequences = [[ids.get(token, 1) for token in standardize(line)[:length]] for line in read_lines(*shard)]
+    seqs = np.zeros((len(sequences), length), dtype=np.int64)
+    for i, seq in enumerate(sequences):
+        seqs[i, :len(seq)] = seq
+
+    targets, contexts, _ = generate_training_data(
+        seqs, params['window_size'], params['num_ns'], len(vocab), seed=seed
+    )
+    # one row per example: [target, context_0 .. context_num_ns]; labels are always [1, 0, ...]
+    rows = np.concatenate([targets[:, np.newaxis], contexts], axis=1).astype(np.int32)
+    rows = rows[np.random.default_rng(seed).permutation(len(rows))]
+
+    block = params['block_size']
+    with tf.io.TFRecordWriter(path) as writer:
+        for i in range(0, len(rows), block):
+            writer.write(rows[i:i+block].tobytes())
+    return path, len(rows)
+
+
+def _fingerprint(files):
+    return [(os.path.abspath(path), os.path.getsize(path), int(os.path.getmtime(path))) for path in files]
+
+
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def prepare(files, out_dir, vocab_size=4096, sequence_length=10, window_size=2, num_ns=4,
+            num_shards=None, workers=None, seed=42, block_size=1024, force=False):
+    """Count the vocabulary and write skip-gram examples of `files` to out_dir.
+
+    Does nothing if out_dir already holds the result for the same files and
+    parameters. Runs in a pool of spawned processes, so it must be called from
+    a script whose module level is safe to import (python -m lab_utils.word2vec),
+    not from a lab itself.
+    """
+    workers = workers or os.cpu_count()
+    num_shards = num_shards or 4 * workers
+    params = {
+        'files': _fingerprint(files), 'vocab_size': vocab_size, 'sequence_length': sequence_length,
+        'window_size': window_size, 'num_ns': num_ns, 'num_shards': num_shards, 'seed': seed,
+        'block_size': block_size,
+    }
+    manifest = read_manifest(out_dir)
+    if manifest and manifest['params'] == params and not force:
+        logger.info(f'{out_dir}: up to date ({manifest["examples"]} examples)')
+        return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    for entry in os.listdir(out_dir):
+        if entry.endswith('.tfrecord') or entry == MANIFEST:
+            os.remove(os.path.join(out_dir, entry))
+
+    shards = split_files(files, num_shards)
+    ctx = multiprocessing.get_context('spawn') # tensorflow is not fork-safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        start = time.perf_counter()
+        counts = collections.Counter()
+        for c in pool.map(_count_shard, shards):
+            counts.update(c)
+        # same layout as TextVectorization's vocabulary: padding, OOV, then by frequency
+        vocab = ['', '[UNK]'] + [t for t, _ in sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:vocab_size - 2]]
+        logger.info(f'vocab: {len(counts)} distinct tokens, kept {len(vocab)} ({time.perf_counter() - start:.2f} secs)')
+
+        start = time.perf_counter()
+        tasks = [
+            (shard, os.path.join(out_dir, f'examples-{i:05d}-of-{len(shards):05d}.tfrecord'), vocab, params, seed + i)
+            for i, shard in enumerate(shards)
+        ]
+        written = list(pool.map(_write_shard, tasks))
+        examples = sum(n for _, n in written)
+        logger.info(f'examples: {examples} in {len(written)} shards ({time.perf_counter() - start:.2f} secs)')
+
+    with open(os.path.join(out_dir, 'vocab.txt'), 'w') as f:
+        f.write('\n'.join(vocab))
+    manifest = {
+        'params': params,
+        'vocab': 'vocab.txt',
+        'shards': [os.path.basename(path) for path, _ in written],
+        'examples': examples,
+        'tokens': sum(counts.values()),
+    }
+    # manifest last: out_dir only counts as prepared once everything is written
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def prepare_subprocess(files, out_dir, **kwargs):
+    """prepare() in a separate `python -m lab_utils.word2vec` process (for labs)."""
+    cmd = [sys.executable, '-m', 'lab_utils.word2vec', *files, '--out', out_dir]
+    for k, v in kwargs.items():
+        if v is True:
+            cmd.append(f'--{k.replace("_", "-")}')
+        elif v not in (None, False):
+            cmd += [f'--{k.replace("_", "-")}', str(v)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    subprocess.run(cmd, check=True, env=env)
+    return read_manifest(out_dir)
+
+
+def load_vocab(out_dir):
+    with open(os.path.join(out_dir, 'vocab.txt')) as f:
+        return f.read().split('\n')
+
+
+def load_examples(out_dir, batch_size, shuffle=True, seed=None):
+    """((targets, contexts), labels) batches read from prepare()'s shards."""
+    manifest = read_manifest(out_dir)
+    width = manifest['params']['num_ns'] + 2 # target + contexts
+
+    files = tf.data.Dataset.from_tensor_slices([os.path.join(out_dir, f) for f in manifest['shards']])
+    if shuffle:
+        files = files.shuffle(len(manifest['shards']), seed=seed)
+    ds = files.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(16, len(manifest['shards'])),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle
+    )
+    ds = ds.map(
+        lambda record: tf.reshape(tf.io.decode_raw(record, tf.int32), (-1, width)),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    if shuffle:
+        ds = ds.shuffle(64, seed=seed) # blocks of block_size examples, already shuffled within a shard
+    ds = ds.unbatch().batch(batch_size, drop_remainder=True)
+
+    def split(rows):
+        rows = tf.cast(rows, tf.int64)
+        labels = tf.one_hot(tf.zeros_like(rows[:, 0]), width - 1, dtype=tf.int64)
+        return (rows[:, 0], rows[:, 1:]), labels
+
+    return ds.map(split, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m lab_utils.word2vec')
+    ap.add_argument('files', nargs='+', help='text files, one sentence per line')
+    ap.add_argument('--out', required=True, help='output directory')
+    ap.add_argument('--vocab-size', type=int, default=4096, help='vocabulary size incl. padding and OOV: 4096*')
+    ap.add_argument('--sequence-length', type=int, default=10, help='tokens per sentence: 10*')
+    ap.add_argument('--window-size', type=int, default=2, help='skip-gram window: 2*')
+    ap.add_argument('--num-ns', type=int, default=4, help='negative samples per positive pair: 4*')
+    ap.add_argument('--num-shards', type=int, default=0, help='shards: 4 x workers*')
+    ap.add_argument('--workers', type=int, default=0, help='worker processes: cpus*')
+    ap.add_argument('--seed', type=int, default=42, help='random seed: 42*')
+    ap.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    opts = ap.parse_args(argv)
+
+    prepare(
+        opts.files, opts.out, opts.vocab_size, opts.sequence_length, opts.window_size, opts.num_ns,
+        opts.num_shards or None, opts.workers or None, opts.seed, force=opts.force
+    )
+
+
+if __name__ == '__main__':
+    main()
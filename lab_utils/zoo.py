@@ -0,0 +1,177 @@
+"""Train a zoo of keras models on windows of a SeriesStore in parallel processes.
+
+    results = zoo.train({
+        'Linear': zoo.candidate(linear, single_step_window),
+        'LSTM': zoo.candidate(lstm_model, wide_window),
+    }, store, epochs=20)
+    zoo.print_report(results)
+
+Every candidate is trained by its own `python -m lab_utils.zoo <task>` process
+with its own CPU-thread budget (the LAB_* variables read by lab_utils, and
+with pin=True its own cpus). All of them read their windows from the same
+memory-mapped store, so the data is in memory once, in the page cache. A
+candidate is a model architecture (Sequential or functional, as json) and a
+window; the trained weights are written back for the caller to load.
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import logger, tf
+from . import timeseries
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def candidate(model, window):
+    """A zoo entry: the architecture of `model` and the window it is trained on."""
+    return {
+        'model': model.to_json(),
+        'window': {
+            'input_width': window.input_width,
+            'label_width': window.label_width,
+            'shift': window.shift,
+            'label_columns': window.label_columns,
+        },
+    }
+
+
+def make_windows(store, split, window, batch_size=32):
+    # the same (inputs, labels) batches as the labs' WindowGenerator.split_window()
+    total = window['input_width'] + window['shift']
+    label_start = total - window['label_width']
+    columns = [store.column_indices[name] for name in window['label_columns'] or []]
+
+    def split_window(features):
+        inputs = features[:, :window['input_width'], :]
+        labels = features[:, label_start:, :]
+        if columns:
+            labels = tf.gather(labels, columns, axis=-1)
+        inputs.set_shape([None, window['input_width'], None])
+        labels.set_shape([None, window['label_width'], None])
+        return inputs, labels
+
+    ds = timeseries.window_dataset(store.split(split), total, batch_size=batch_size)
+    return ds.map(split_window, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def train_one(task):
+    """Fit and evaluate one candidate (in a worker process)."""
+    start = time.perf_counter()
+    store = timeseries.SeriesStore(task['store']).open()
+    train_ds, val_ds, test_ds = (make_windows(store, split, task['window']) for split in ('train', 'val', 'test'))
+
+    model = tf.keras.models.model_from_json(task['model'])
+    model.compile(
+        loss=tf.losses.MeanSquaredError(),
+        optimizer=tf.optimizers.Adam(),
+        metrics=[tf.metrics.MeanAbsoluteError()]
+    )
+    early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=task['patience'], mode='min')
+    history = model.fit(train_ds, epochs=task['epochs'], validation_data=val_ds, callbacks=[early_stopping], verbose=0)
+
+    model.save_weights(os.path.join(task['out'], 'ckpt'))
+    return {
+        'name': task['name'],
+        'status': 'ok',
+        'val': model.evaluate(val_ds, verbose=0),
+        'test': model.evaluate(test_ds, verbose=0),
+        'epochs': len(history.history['loss']),
+        'wall': time.perf_counter() - start,
+        'weights': os.path.join(task['out'], 'ckpt'),
+    }
+
+
+def _slug(name):
+    return ''.join(c if c.isalnum() else '_' for c in name.lower())
+
+
+def train(candidates, store, epochs=20, patience=2, jobs=None, threads=None, pin=False, out_dir='tmp/zoo'):
+    """{name: result} of training every candidate in its own process.
+
+    A result holds the [loss, mae] evaluations ('val', 'test'), the number of
+    epochs run, the wall time of the worker and the path of its weights.
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    jobs = jobs or min(len(candidates), len(cpus))
+    threads = threads or max(1, len(cpus) // jobs)
+
+    # one cpu slice per worker slot, as in lab_utils.runner
+    slots = queue.Queue()
+    for i in range(jobs):
+        slots.put(cpus[i*threads:(i+1)*threads] if pin and (i+1)*threads <= len(cpus) else None)
+
+    logger.info(f'{len(candidates)} models, {jobs} jobs x {threads} threads{" (pinned)" if pin else ""}')
+
+    def job(name):
+        out = os.path.abspath(os.path.join(out_dir, _slug(name)))
+        os.makedirs(out, exist_ok=True)
+        task = dict(candidates[name], name=name, store=os.path.abspath(store.path), epochs=epochs, patience=patience, out=out)
+        with open(os.path.join(out, 'task.json'), 'w') as f:
+            json.dump(task, f)
+
+        env = dict(os.environ)
+        env.update({
+            'LAB_INTRA_THREADS': str(threads),
+            'LAB_INTER_THREADS': str(max(1, threads // 2)),
+            'OMP_NUM_THREADS': str(threads),
+            'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+        })
+        result_path = os.path.join(out, 'result.json')
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+        slot = slots.get()
+        if slot:
+            env['LAB_CPUS'] = ','.join(map(str, slot))
+        try:
+            start = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, '-m', 'lab_utils.zoo', os.path.join(out, 'task.json')],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+            )
+        finally:
+            slots.put(slot)
+
+        with open(os.path.join(out, 'worker.log'), 'w') as f:
+            f.write(proc.stdout)
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            logger.warning(f'{name}: failed, see {os.path.join(out, "worker.log")}')
+            return {'name': name, 'status': 'failed', 'wall': time.perf_counter() - start}
+        with open(result_path) as f:
+            result = json.load(f)
+        logger.info(f"{name}: {result['epochs']} epochs in {result['wall']:.1f} secs, val mae {result['val'][1]:.4f}")
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(job, candidates))
+    logger.info(f'model zoo: {time.perf_counter() - start:.1f} secs')
+    return {r['name']: r for r in results}
+
+
+def print_report(results):
+    print("\n#################################################")
+    print(f"{'model':20s} {'status':7s} {'epochs':>6s} {'wall':>8s} {'val mae':>9s} {'test mae':>9s}")
+    for name, r in sorted(results.items(), key=lambda x: x[1]['val'][1] if x[1]['status'] == 'ok' else float('inf')):
+        if r['status'] != 'ok':
+            print(f"{name[:20]:20s} {r['status']:7s} {'-':>6s} {r['wall']:8.1f} {'-':>9s} {'-':>9s}")
+            continue
+        print(f"{name[:20]:20s} {r['status']:7s} {r['epochs']:6d} {r['wall']:8.1f} {r['val'][1]:9.4f} {r['test'][1]:9.4f}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    with open(argv[0]) as f:
+        task = json.load(f)
+    result = train_one(task)
+    with open(os.path.join(task['out'], 'result.json'), 'w') as f:
+        json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,8 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Dense, Embedding, GlobalAveragePooling1D
 from tensorflow.keras.layers.experimental.preprocessing import TextVectorization
 
+from lab_utils import vocabulary
+
 
 ### TOC
 if args.step == 0:
@@ -186,7 +188,10 @@ if args.step in [5, 6, 7, 8]:
 
     # Make a text-only dataset (no labels) and call adapt to build the vocabulary.
     text_ds = train_ds.map(lambda x, y: x)
-    vectorize_layer.adapt(text_ds)
+    # (the adapted vocabulary is reused across runs with --cache)
+    vocabulary.VocabStore().adapt(
+        vectorize_layer, text_ds, sources=[train_dir, 'training', 0.2, seed], name='imdb'
+    )
 
 
 args.step = auto_increment(args.step, args.all)
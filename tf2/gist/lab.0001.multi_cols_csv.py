@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 # if args.steps:
 #     args.steps = [int(n) for n in args.steps.split(",")]
 #     logger.info(f'Step #{args.steps} will be run')
@@ -43,9 +47,6 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Flatten, Dense, Dropout, Concatenate
 from tensorflow.keras.layers.experimental import preprocessing
 
-### TOC
-if args.step == 0:
-    toc(__file__)
 
 
 args.step = auto_increment(args.step, args.all)
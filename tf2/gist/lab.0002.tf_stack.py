@@ -24,6 +24,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 
@@ -31,9 +35,6 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Flatten, Dense, Dropout, Concatenate
 from tensorflow.keras.layers.experimental import preprocessing
 
-### TOC
-if args.step == 0:
-    toc(__file__)
 
 
 args.step = auto_increment(args.step, args.all)
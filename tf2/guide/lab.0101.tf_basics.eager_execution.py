@@ -6,7 +6,7 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 # ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
@@ -26,13 +26,12 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
-import time
-
-
 ### TOC
 if args.step == 0:
     toc(__file__)
 
+import time
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Setup and basic usage
@@ -403,21 +402,22 @@ if args.step == 11:
     '''
     print(__doc__)
 
-    def measure(x, steps):
+    def measure(x, steps, name):
         # TensorFlow initializes a GPU the first time it's used, exclude from timing.
         tf.matmul(x, x)
-        start = time.time()
-        for i in range(steps):
-            x = tf.matmul(x, x)
-        # tf.matmul can return before completing the matrix multiplication
-        # (e.g., can return after enqueing the operation on a CUDA stream).
-        # The x.numpy() call below will ensure that all enqueued operations
-        # have completed (and will also copy the result to host memory,
-        # so we're including a little more than just the matmul operation
-        # time).
-        _ = x.numpy()
-        end = time.time()
-        return end - start
+        def matmuls():
+            y = x
+            for i in range(steps):
+                y = tf.matmul(y, y)
+            # tf.matmul can return before completing the matrix multiplication
+            # (e.g., can return after enqueing the operation on a CUDA stream).
+            # The y.numpy() call below will ensure that all enqueued operations
+            # have completed (and will also copy the result to host memory,
+            # so we're including a little more than just the matmul operation
+            # time).
+            _ = y.numpy()
+        # examples: one matmul each
+        return bench.run(matmuls, name=name, examples=steps)['mean']
 
     shape = (1000, 1000)
     steps = 200
@@ -425,12 +425,12 @@ if args.step == 11:
 
     # Run on CPU:
     with tf.device("/cpu:0"):
-        logger.info("CPU: {:.3f} secs".format(measure(tf.random.normal(shape), steps)))
+        logger.info("CPU: {:.3f} secs".format(measure(tf.random.normal(shape), steps, 'matmul on CPU')))
 
     # Run on GPU, if available:
     if tf.config.list_physical_devices("GPU"):
         with tf.device("/gpu:0"):
-            logger.info("GPU: {:.3f} secs".format(measure(tf.random.normal(shape), steps)))
+            logger.info("GPU: {:.3f} secs".format(measure(tf.random.normal(shape), steps, 'matmul on GPU')))
     else:
         logger.info("GPU: not found")
 
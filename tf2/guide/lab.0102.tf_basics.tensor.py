@@ -26,13 +26,12 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
-import time
-
-
 ### TOC
 if args.step == 0:
     toc(__file__)
 
+import time
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Basics
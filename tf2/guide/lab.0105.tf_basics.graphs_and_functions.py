@@ -26,15 +26,14 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
-import time
-import timeit
-import datetime
-
-
 ### TOC
 if args.step == 0:
     toc(__file__)
 
+import time
+import timeit
+import datetime
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Overview: What are graphs?
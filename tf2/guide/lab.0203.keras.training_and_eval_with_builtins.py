@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 
@@ -37,11 +41,6 @@ from tensorflow.keras.layers import GlobalMaxPooling1D, MaxPooling2D, GlobalMaxP
 from tensorflow.keras.layers import Embedding, LSTM
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 if args.step or args.all:
     if not os.path.exists('tmp/tf2_g0203/'):
         os.mkdir('tmp/tf2_g0203/')
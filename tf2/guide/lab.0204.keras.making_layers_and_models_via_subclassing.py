@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 
@@ -33,11 +37,6 @@ from tensorflow.keras import Input, Model
 from tensorflow.keras.layers import Layer, Dense
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - The Layer class: the combination of state (weights) and some computation
 if args.step == 1:
@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 
@@ -33,11 +37,6 @@ from tensorflow.keras import Input, Model, Sequential
 from tensorflow.keras.layers import Layer, Dense, InputLayer, Dropout
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 if args.step or args.all:
     def get_model():
         # Create a simple model.
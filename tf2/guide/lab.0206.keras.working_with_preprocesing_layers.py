@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 
@@ -40,11 +44,6 @@ from tensorflow.keras.layers.experimental import preprocessing
 # Keras models, and exported as part of a Keras SavedModel.
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Keras preprocessing layers
 if args.step == 1:
@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 
@@ -34,11 +38,6 @@ from tensorflow.keras.layers import Layer, Dense, Reshape, InputLayer
 from tensorflow.keras.layers import Conv2D, LeakyReLU, GlobalMaxPooling2D,  Conv2DTranspose
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Introduction
 if args.step == 1:
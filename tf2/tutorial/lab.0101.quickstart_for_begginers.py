@@ -6,7 +6,7 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
@@ -26,17 +26,16 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 
 from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Import the MNIST dataset
 if args.step >= 1:
@@ -77,6 +76,18 @@ if args.step >= 2:
         model = Model(inputs=inputs, outputs=outputs)
         return model
 
+    def resetter(model, optimizer):
+        # bench.run() setup: every training run starts from the same initial
+        # weights and a fresh optimizer state, so the model evaluated after
+        # --bench has been trained once, not warmup + repeats times
+        weights = model.get_weights()
+
+        def reset():
+            model.set_weights(weights)
+            for var in optimizer.variables():
+                var.assign(tf.zeros_like(var))
+        return reset
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #3 - Build a sequentail model, and fit() with (x_train,y_train)
@@ -100,12 +111,12 @@ if args.step == 3:
     logger.info(f"loss before training: {batch_loss:.2f}\n")
 
     epochs = args.epochs # 10
-    start = time.time()
-    model.fit(x_train, y_train, epochs=epochs, batch_size=32, shuffle=True, verbose=2)
-    end = time.time()
+    bench.run(
+        lambda: model.fit(x_train, y_train, epochs=epochs, batch_size=32, shuffle=True, verbose=0 if args.bench else 2),
+        name="Sequential model with fit(x_train,y_train)", examples=len(x_train)*epochs,
+        setup=resetter(model, optimizer)
+    )
     print()
-    
-    logger.info(f"Sequential model with fit(x_train,y_train): {end - start:.2f} secs\n")
 
     test_loss, test_acc = model.evaluate(x_test, y_test, verbose=0)
     logger.info(f'Test accuracy: {test_acc:.4f}\n')
@@ -135,11 +146,12 @@ if args.step == 4:
     )
 
     epochs = args.epochs # 10
-    start = time.time()
-    model.fit(train_ds, epochs=epochs, verbose=2)
-    end = time.time()
+    bench.run(
+        lambda: model.fit(train_ds, epochs=epochs, verbose=0 if args.bench else 2),
+        name="Sequential model with fit(train_ds)", examples=len(x_train)*epochs,
+        setup=resetter(model, optimizer)
+    )
     print()
-    logger.info(f"Sequential model with fit(train_ds): {end - start:.2f} secs\n")
 
     test_loss, test_acc = model.evaluate(x_test, y_test, verbose=0)
     logger.info(f'Test accuracy: {test_acc:.4f}')
@@ -170,27 +182,26 @@ if args.step == 5:
         train_loss.update_state(loss)
         train_accuracy.update_state(labels, predictions)
 
-    start = time.time()
-    epochs = args.epochs # 10
-    for epoch in range(epochs):
-        for batch, (images, labels) in enumerate(train_ds):
-            train_step(images, labels)
+    def train(epochs):
+        for epoch in range(epochs):
+            for batch, (images, labels) in enumerate(train_ds):
+                train_step(images, labels)
 
-        # logger.info(
-        #     f'Epoch {epoch+1}/{epochs} => loss: {train_loss.result():.4f} - accuracy: {train_accuracy.result():.4f}'
-        # )
+            # logger.info(
+            #     f'Epoch {epoch+1}/{epochs} => loss: {train_loss.result():.4f} - accuracy: {train_accuracy.result():.4f}'
+            # )
 
-        # Display metrics at the end of each epoch.
-        t_loss = train_loss.result()
-        t_acc = train_accuracy.result()
-        logger.info(f"Epoch {epoch}/{epochs} - loss: {t_loss:.4f} - accuracy: {t_acc:.4f}")
+            # Display metrics at the end of each epoch.
+            t_loss = train_loss.result()
+            t_acc = train_accuracy.result()
+            logger.info(f"Epoch {epoch}/{epochs} - loss: {t_loss:.4f} - accuracy: {t_acc:.4f}")
 
-        # Reset training metrics at the end of each epoch
-        train_loss.reset_states()
-        train_accuracy.reset_states()
+            # Reset training metrics at the end of each epoch
+            train_loss.reset_states()
+            train_accuracy.reset_states()
 
-    end = time.time()
-    logger.info(f"Sequential model with custom train loop: {end - start:.2f} secs")
+    epochs = args.epochs # 10
+    bench.run(lambda: train(epochs), name="Sequential model with custom train loop", examples=len(x_train)*epochs, setup=resetter(model, optimizer))
 
 
 args.step = auto_increment(args.step, args.all)
@@ -209,11 +220,11 @@ if args.step == 6:
     )
 
     epochs = args.epochs # 10
-    start = time.time()
-    model.fit(x_train, y_train, epochs=epochs, batch_size=32, shuffle=True, verbose=2)
-    end = time.time()
-    print()
-    logger.info(f"Functional model with fit(x_train,y_train): {end - start:.2f} secs")
+    bench.run(
+        lambda: model.fit(x_train, y_train, epochs=epochs, batch_size=32, shuffle=True, verbose=0 if args.bench else 2),
+        name="Functional model with fit(x_train,y_train)", examples=len(x_train)*epochs,
+        setup=resetter(model, optimizer)
+    )
 
 
 args.step = auto_increment(args.step, args.all)
@@ -232,11 +243,11 @@ if args.step == 7:
     )
 
     epochs = args.epochs # 10
-    start = time.time()
-    model.fit(train_ds, epochs=epochs, verbose=2)
-    end = time.time()
-    print()
-    logger.info(f"Functional model with fit(drain_ds): {end - start:.2f} secs")
+    bench.run(
+        lambda: model.fit(train_ds, epochs=epochs, verbose=0 if args.bench else 2),
+        name="Functional model with fit(train_ds)", examples=len(x_train)*epochs,
+        setup=resetter(model, optimizer)
+    )
 
 
 args.step = auto_increment(args.step, args.all)
@@ -266,27 +277,26 @@ if args.step == 8:
         train_loss.update_state(loss)
         train_accuracy.update_state(labels, predictions)
 
-    start = time.time()
-    epochs = args.epochs # 10
-    for epoch in range(epochs):
-        for batch, (images, labels) in enumerate(train_ds):
-            train_step(images, labels)
+    def train(epochs):
+        for epoch in range(epochs):
+            for batch, (images, labels) in enumerate(train_ds):
+                train_step(images, labels)
 
-        # logger.info(
-        #     f'Epoch {epoch+1}/{epochs} => loss: {train_loss.result():.4f} - accuracy: {train_accuracy.result():.4f}'
-        # )
+            # logger.info(
+            #     f'Epoch {epoch+1}/{epochs} => loss: {train_loss.result():.4f} - accuracy: {train_accuracy.result():.4f}'
+            # )
 
-        # Display metrics at the end of each epoch.
-        t_loss = train_loss.result()
-        t_acc = train_accuracy.result()
-        logger.info(f"Epoch {epoch}/{epochs} - loss: {t_loss:.4f} - accuracy: {t_acc:.4f}")
+            # Display metrics at the end of each epoch.
+            t_loss = train_loss.result()
+            t_acc = train_accuracy.result()
+            logger.info(f"Epoch {epoch}/{epochs} - loss: {t_loss:.4f} - accuracy: {t_acc:.4f}")
 
-        # Reset training metrics at the end of each epoch
-        train_loss.reset_states()
-        train_accuracy.reset_states()
+            # Reset training metrics at the end of each epoch
+            train_loss.reset_states()
+            train_accuracy.reset_states()
 
-    end = time.time()
-    logger.info(f"Functional model with custom train loop: {end - start:.2f} secs")
+    epochs = args.epochs # 10
+    bench.run(lambda: train(epochs), name="Functional model with custom train loop", examples=len(x_train)*epochs, setup=resetter(model, optimizer))
    
 
 ### End of File
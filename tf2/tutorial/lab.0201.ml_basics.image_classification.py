@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 
 from tensorflow.keras import Sequential, Model, Input
@@ -33,11 +37,6 @@ from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 from tensorflow.keras.layers import Conv2D, GlobalAveragePooling2D
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Import the Fashion MNIST dataset
 if args.step >= 1:
@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import re
 import shutil
@@ -36,10 +40,7 @@ from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 from tensorflow.keras.layers import Embedding, Activation, GlobalAveragePooling1D
 from tensorflow.keras.layers.experimental.preprocessing import TextVectorization
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import vocabulary
 
 
 args.step = auto_increment(args.step, args.all)
@@ -142,8 +143,11 @@ if args.step >= 3:
         output_sequence_length=sequence_length
     )
 
+    # the adapted vocabulary is reused across runs with --cache
     train_text = raw_train_ds.map(lambda x, y: x)
-    vectorize_layer.adapt(train_text)
+    vocabulary.VocabStore().adapt(
+        vectorize_layer, train_text, sources=[train_dir, 'training', 0.2, seed], name='imdb'
+    )
 
     def vectorize_text(text, label):
         text = tf.expand_dims(text, -1) # scalar to vector
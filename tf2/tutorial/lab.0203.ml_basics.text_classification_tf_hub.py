@@ -29,6 +29,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import re
 import shutil
@@ -41,11 +45,6 @@ import tensorflow_hub as tfhub
 import tensorflow_datasets as tfds
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Download the IMDB dataset 
 if args.step >= 1: 
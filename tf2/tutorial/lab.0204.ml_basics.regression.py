@@ -28,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 import seaborn as sns
@@ -37,11 +41,6 @@ from tensorflow.keras.layers import Dense
 from tensorflow.keras.layers.experimental.preprocessing import Normalization
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - The Auto MPG dataset: Get the data
 if args.step >= 1: 
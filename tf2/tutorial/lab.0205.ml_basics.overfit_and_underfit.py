@@ -28,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pathlib
 import shutil
@@ -41,11 +45,6 @@ import tensorflow_docs.modeling
 import tensorflow_docs.plots
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 if args.step or args.all:
     # logdir = pathlib.Path(tempfile.mkdtemp())/"tensorboard_logs"
     # shutil.rmtree(logdir, ignore_errors=True)
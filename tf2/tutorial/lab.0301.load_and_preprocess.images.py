@@ -8,11 +8,13 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=3, help='number of epochs: 3*')
 ap.add_argument('--batch', type=int, default=32, help='batch size: 32*')
+ap.add_argument('--shards', '--no-shards', dest='shards', default=False, action=BooleanAction, help='read resized images from TFRecord shards: F*')
+ap.add_argument('--fast-decode', '--no-fast-decode', dest='fast_decode', default=False, action=BooleanAction, help='decode jpegs at reduced scale before resizing: F*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -28,6 +30,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -38,10 +44,7 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 
 import tensorflow_datasets as tfds
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import images
 
 
 args.step = auto_increment(args.step, args.all)
@@ -91,25 +94,33 @@ if args.step >= 2:
     img_height = 180
     img_width = 180
 
-    train_ds = tf.keras.preprocessing.image_dataset_from_directory(
-        dataset_dir,
-        validation_split=0.2,
-        subset="training",
-        seed=123,
-        image_size=(img_height, img_width),
-        batch_size=batch_size
-    )
-
-    val_ds = tf.keras.preprocessing.image_dataset_from_directory(
-        dataset_dir,
-        validation_split=0.2,
-        subset="validation",
-        seed=123,
-        image_size=(img_height, img_width),
-        batch_size=batch_size
-    )
-
-    class_names = train_ds.class_names
+    if args.shards:
+        # the same split, decoded and resized once into TFRecord shards (see lab_utils.images)
+        shards_dir = f'tmp/images/flower_photos-{img_height}x{img_width}'
+        manifest = images.prepare(dataset_dir, shards_dir, image_size=(img_height, img_width), validation_split=0.2, seed=123)
+        train_ds = images.load(shards_dir, 'training', batch_size=batch_size)
+        val_ds = images.load(shards_dir, 'validation', batch_size=batch_size)
+        class_names = manifest['class_names']
+    else:
+        train_ds = tf.keras.preprocessing.image_dataset_from_directory(
+            dataset_dir,
+            validation_split=0.2,
+            subset="training",
+            seed=123,
+            image_size=(img_height, img_width),
+            batch_size=batch_size
+        )
+
+        val_ds = tf.keras.preprocessing.image_dataset_from_directory(
+            dataset_dir,
+            validation_split=0.2,
+            subset="validation",
+            seed=123,
+            image_size=(img_height, img_width),
+            batch_size=batch_size
+        )
+
+        class_names = train_ds.class_names
 
     if args.step == 2:
         print()
@@ -230,6 +241,9 @@ if args.step >= 7:
         return tf.argmax(one_hot)
 
     def decode_img(img):
+        if args.fast_decode:
+            # decoded at 1/2, 1/4 or 1/8 scale when the jpeg is that much larger (see lab_utils.images)
+            return images.decode_jpeg_resized(img, [img_height, img_width])
         # convert the compressed string to a 3D uint8 tensor
         img = tf.image.decode_jpeg(img, channels=3)
         # resize the image to the desired size
@@ -251,6 +265,24 @@ if args.step >= 7:
             logger.info("Image shape: {}".format(image.numpy().shape))
             logger.info("Label: {}".format(label.numpy()))
 
+    if args.shards:
+        # (img, label) pairs read from the shards written in step 2: no file
+        # opens, decoding or resizing per image (and the split of step 2)
+        shards_train_ds = images.load(shards_dir, 'training', batch_size=None)
+        shards_val_ds = images.load(shards_dir, 'validation', batch_size=None)
+
+        if args.step == 7 and args.bench:
+            def drain(ds):
+                for _ in ds:
+                    pass
+
+            print()
+            train_count = manifest['subsets']['training']['count']
+            bench.run(lambda: drain(train_ds.batch(batch_size)), name='epoch: decode and resize jpegs (images)', examples=image_count - val_size)
+            bench.run(lambda: drain(shards_train_ds.batch(batch_size)), name='epoch: tfrecord shards (images)', examples=train_count)
+
+        train_ds, val_ds = shards_train_ds, shards_val_ds
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #8 - Using tf.data for finer control: Configure dataset for performance
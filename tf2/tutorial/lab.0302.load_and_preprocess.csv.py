@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 import itertools
@@ -37,11 +41,6 @@ from tensorflow.keras.layers import Flatten, Dense, Dropout, Concatenate
 from tensorflow.keras.layers.experimental import preprocessing
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - In memory data
 if args.step in [1, 2]: 
@@ -30,6 +30,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import collections
 import pathlib
@@ -44,10 +48,7 @@ from tensorflow.keras.layers.experimental.preprocessing import TextVectorization
 import tensorflow_datasets as tfds
 import tensorflow_text as tf_text
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import vocabulary
 
 
 ### Common across all steps
@@ -159,9 +160,12 @@ if args.step in [3, 4, 5, 6, 7]:
     )
 
     # Make a text-only dataset (without labels), then call adapt
+    # (the adapted vocabularies are reused across runs with --cache)
     train_text = raw_train_ds.map(lambda text, labels: text)
-    binary_vectorize_layer.adapt(train_text)
-    int_vectorize_layer.adapt(train_text)
+    vocab_store = vocabulary.VocabStore()
+    sources = [train_dir, 'training', 0.2, seed]
+    vocab_store.adapt(binary_vectorize_layer, train_text, sources, name='stack_overflow')
+    vocab_store.adapt(int_vectorize_layer, train_text, sources, name='stack_overflow')
 
     def binary_vectorize_text(text, label):
         text = tf.expand_dims(text, -1)
@@ -373,28 +377,22 @@ if args.step in [10, 11, 12, 13, 14]:
         print()
 
     tokenized_ds = configure_dataset(tokenized_ds)
-    vocab_dict = collections.defaultdict(lambda: 0)
-    for toks in tokenized_ds.as_numpy_iterator():
-        for tok in toks:
-            vocab_dict[tok] += 1
-
-    vocab = sorted(vocab_dict.items(), key=lambda x: x[1], reverse=True)
-    vocab = [token for token, count in vocab]
-    vocab = vocab[:VOCAB_SIZE]
+    # tokens are counted per batch in the tf.data graph, not one by one in python
+    # (and the vocabulary is reused across runs with --cache); only the
+    # 10 x VOCAB_SIZE most frequent tokens are tracked, so the counter stays bounded
+    vocab_capacity = 10 * VOCAB_SIZE
+    vocab = vocabulary.VocabStore().get(
+        'illiad', lambda: vocabulary.build_vocab(tokenized_ds, VOCAB_SIZE, capacity=vocab_capacity),
+        sources=[str(parent_dir/name) for name in FILE_NAMES],
+        max_tokens=VOCAB_SIZE, capacity=vocab_capacity, standardize=tf_text.case_fold_utf8, split=tokenizer.tokenize
+    )
     vocab_size = len(vocab)
     if args.step == 10:
         logger.info("Vocab size: {}".format(vocab_size))
         logger.info("First five vocab entries:\n{}\n".format(vocab[:5]))
 
-    keys = vocab
-    values = range(2, len(vocab) + 2)  # reserve 0 for padding, 1 for OOV
-
-    init = tf.lookup.KeyValueTensorInitializer(
-        keys, values, key_dtype=tf.string, value_dtype=tf.int64
-    )
-
-    num_oov_buckets = 1
-    vocab_table = tf.lookup.StaticVocabularyTable(init, num_oov_buckets)
+    # reserve 0 for padding, 1 for OOV
+    vocab_table = vocabulary.lookup_table(vocab, num_oov_buckets=1, offset=2)
 
     def preprocess_text(text, label):
         standardized = tf_text.case_fold_utf8(text)
@@ -556,7 +554,7 @@ if args.step >= 16:
 
     # Make a text-only dataset (without labels), then call adapt
     train_text = train_ds.map(lambda text, labels: text)
-    vectorize_layer.adapt(train_text)
+    vocabulary.VocabStore().adapt(vectorize_layer, train_text, sources=['tfds', 'imdb_reviews', 'train'], name='imdb_reviews')
 
     def vectorize_text(text, label):
         text = tf.expand_dims(text, -1)
@@ -6,7 +6,7 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
@@ -26,13 +26,12 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
-import time
-
-
 ### TOC
 if args.step == 0:
     toc(__file__)
 
+import time
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Tensors
@@ -104,11 +103,12 @@ if args.step == 5:
     print("\n### Step #5 - GPU acceleration: Explicit Device Placement")
 
     def time_matmul(x, n=10):
-        start = time.time()
-        for loop in range(n):
-            tf.matmul(x, x)
+        def matmuls():
+            for loop in range(n):
+                y = tf.matmul(x, x)
+            _ = y.numpy() # wait for the (possibly async) device to finish
 
-        result = time.time()-start
+        result = bench.run(matmuls, name=f'matmul on {x.device[-5:]}', examples=n)['mean']
         print("{} loops: {:0.2f}ms".format(n, 1000*result))
 
     N = 1000 # 100, 10(작은 반복에서는 CPU가 더 빠름)
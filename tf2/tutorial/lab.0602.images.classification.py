@@ -11,6 +11,7 @@ from lab_utils import (
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--shards', '--no-shards', dest='shards', default=False, action=BooleanAction, help='read resized images from TFRecord shards: F*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +27,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -34,10 +39,7 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 from tensorflow.keras.layers import Conv2D, MaxPooling2D
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import images
 
 
 args.step = auto_increment(args.step, args.all)
@@ -78,25 +80,33 @@ if args.step >= 2:
     img_height = 180
     img_width = 180
 
-    train_ds = tf.keras.preprocessing.image_dataset_from_directory(
-        data_dir,
-        validation_split=0.2,
-        subset="training",
-        seed=123,
-        image_size=(img_height, img_width),
-        batch_size=batch_size
-    )
-
-    val_ds = tf.keras.preprocessing.image_dataset_from_directory(
-        data_dir,
-        validation_split=0.2,
-        subset="validation",
-        seed=123,
-        image_size=(img_height, img_width),
-        batch_size=batch_size
-    )
-
-    class_names = train_ds.class_names
+    if args.shards:
+        # the same split, decoded and resized once into TFRecord shards (see lab_utils.images)
+        shards_dir = f'tmp/images/flower_photos-{img_height}x{img_width}'
+        manifest = images.prepare(data_dir, shards_dir, image_size=(img_height, img_width), validation_split=0.2, seed=123)
+        train_ds = images.load(shards_dir, 'training', batch_size=batch_size)
+        val_ds = images.load(shards_dir, 'validation', batch_size=batch_size)
+        class_names = manifest['class_names']
+    else:
+        train_ds = tf.keras.preprocessing.image_dataset_from_directory(
+            data_dir,
+            validation_split=0.2,
+            subset="training",
+            seed=123,
+            image_size=(img_height, img_width),
+            batch_size=batch_size
+        )
+
+        val_ds = tf.keras.preprocessing.image_dataset_from_directory(
+            data_dir,
+            validation_split=0.2,
+            subset="validation",
+            seed=123,
+            image_size=(img_height, img_width),
+            batch_size=batch_size
+        )
+
+        class_names = train_ds.class_names
     if args.step == 2:
         logger.info(f'class_names:\n{class_names}')
 
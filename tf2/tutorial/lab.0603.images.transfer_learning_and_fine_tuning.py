@@ -11,6 +11,7 @@ from lab_utils import (
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--feature-cache', '--no-feature-cache', dest='feature_cache', default=False, action=BooleanAction, help='train the head on stored features of the frozen base: F*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +27,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -34,10 +39,7 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, GlobalAveragePooling2D
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import features
 
 
 args.step = auto_increment(args.step, args.all)
@@ -230,18 +232,67 @@ if args.step >= 10:
     print("\n### Step #10 - Feature extraction: Train the model")
 
     initial_epochs = 10
-    loss0, accuracy0 = model.evaluate(validation_dataset, verbose=0)
+
+    if args.feature_cache:
+        # while the base is frozen, it maps an image to the same pooled features
+        # in every epoch: they are computed once (without data augmentation),
+        # stored on disk (see lab_utils.features) and the head is trained on them
+        def extract_features(images, labels):
+            x = preprocess_input(images)
+            x = base_model(x, training=False)
+            return global_average_layer(x), labels
+
+        def feature_store(name, directory, *params):
+            return features.FeatureStore(
+                f'cats_and_dogs_{name}', [directory], extract_features, IMG_SIZE, 'mobilenet_v2', 'imagenet', *params,
+                enabled=True
+            )
+
+        train_features = feature_store('train', train_dir).dataset(
+            lambda: train_dataset.map(extract_features).unbatch()
+        ).cache()
+        validation_features = feature_store('validation', validation_dir, 'skip', 5).dataset(
+            lambda: validation_dataset.map(extract_features).unbatch()
+        ).cache()
+
+        # the same dropout and prediction layer (shared weights) as the model
+        feature_inputs = Input(shape=(base_model.output_shape[-1],))
+        head = Model(feature_inputs, prediction_layer(Dropout(0.2)(feature_inputs)))
+        head.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=base_learning_rate),
+            loss=tf.keras.losses.BinaryCrossentropy(from_logits=True),
+            metrics=['accuracy']
+        )
+
+    # the head alone on the stored features as long as the base is frozen,
+    # the whole model end to end once fine tuning unfreezes any of its layers
+    def fit(epochs, initial_epoch=0, verbose=0):
+        if args.feature_cache and not base_model.trainable_weights:
+            return head.fit(
+                train_features.shuffle(2000).batch(BATCH_SIZE),
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                validation_data=validation_features.batch(BATCH_SIZE),
+                verbose=verbose
+            )
+        return model.fit(
+            train_dataset,
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            validation_data=validation_dataset,
+            verbose=verbose
+        )
+
+    if args.feature_cache:
+        loss0, accuracy0 = head.evaluate(validation_features.batch(BATCH_SIZE), verbose=0)
+    else:
+        loss0, accuracy0 = model.evaluate(validation_dataset, verbose=0)
 
     if args.step == 10:
         logger.info("initial loss: {:.2f}".format(loss0))
         logger.info("initial accuracy: {:.2f}".format(accuracy0))
 
-    history = model.fit(
-        train_dataset,
-        epochs=initial_epochs,
-        validation_data=validation_dataset,
-        verbose=2 if args.step == 10 else 0
-    )
+    history = fit(initial_epochs, verbose=2 if args.step == 10 else 0)
 
 
 args.step = auto_increment(args.step, args.all)
@@ -326,13 +377,7 @@ if args.step >= 14:
     fine_tune_epochs = 10
     total_epochs =  initial_epochs + fine_tune_epochs
 
-    history_fine = model.fit(
-        train_dataset,
-        epochs=total_epochs,
-        initial_epoch=history.epoch[-1],
-        validation_data=validation_dataset,
-        verbose=2 if args.step == 10 else 0
-    )
+    history_fine = fit(total_epochs, initial_epoch=history.epoch[-1], verbose=2 if args.step == 10 else 0)
 
     acc = history.history['accuracy']
     val_acc = history.history['val_accuracy']
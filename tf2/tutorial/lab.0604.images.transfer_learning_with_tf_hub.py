@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -37,11 +41,6 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 import tensorflow_hub as hub
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - An ImageNet classifier: Download the classifier
 if args.step in [1, 2, 3, 4, 5]:
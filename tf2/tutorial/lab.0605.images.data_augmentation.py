@@ -6,11 +6,13 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--batch-sizes', type=int, nargs='*', default=[32, 128], help='batch sizes of the augmentation benchmark: 32 128*')
+ap.add_argument('--data-threads', type=int, nargs='*', default=[0], help='tf.data threads of the augmentation benchmark (0: default pool): 0*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -36,10 +42,7 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 
 import tensorflow_datasets as tfds
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import augmentation
 
 
 args.step = auto_increment(args.step, args.all)
@@ -69,7 +72,7 @@ if args.step >= 1:
 
 args.step = auto_increment(args.step, args.all)
 ### Step #2 - Use Keras preprocessing layers: Resizing and rescaling
-if args.step in [2, 3, 4, 5, 6, 7]:
+if args.step in [2, 3, 4, 5, 6, 7, 12]:
     print("\n### Step #2 - Use Keras preprocessing layers: Resizing and rescaling")
 
     IMG_SIZE = 180
@@ -93,7 +96,7 @@ if args.step in [2, 3, 4, 5, 6, 7]:
 
 args.step = auto_increment(args.step, args.all)
 ### Step #3 - Use Keras preprocessing layers: Data augmentation
-if args.step in [3, 4, 5, 6, 7]:
+if args.step in [3, 4, 5, 6, 7, 12]:
     print("\n### Step #3 - Use Keras preprocessing layers: Data augmentation")
 
     data_augmentation = Sequential([
@@ -204,7 +207,7 @@ if args.step == 6:
 
 args.step = auto_increment(args.step, args.all)
 ### Step #7 - Use Keras preprocessing layers: Custom data augmentation
-if args.step == 7:
+if args.step in [7, 12]:
     print("\n### Step #7 - Use Keras preprocessing layers: Custom data augmentation")
 
     def random_invert_img(x, p=0.5):
@@ -219,7 +222,7 @@ if args.step == 7:
 
     random_invert = random_invert()
 
-    if args.plot:
+    if args.step == 7 and args.plot:
         plt.figure(figsize=(10, 10))
         for i in range(9):
             augmented_image = random_invert(image)
@@ -236,7 +239,7 @@ if args.step == 7:
         def call(self, x):
             return random_invert_img(x)
 
-    if args.plot:
+    if args.step == 7 and args.plot:
         plt.figure(figsize=(10, 10))
         for i in range(9):
             ax = plt.subplot(3, 3, i + 1)
@@ -330,7 +333,7 @@ if args.step == 10:
 
 args.step = auto_increment(args.step, args.all)
 ### Step #11 - Using tf.image: Apply augmentation to a dataset
-if args.step == 11:
+if args.step in [11, 12]:
     print("\n### Step #11 - Using tf.image: Apply augmentation to a dataset")
     
     AUTOTUNE = tf.data.AUTOTUNE
@@ -426,6 +429,142 @@ if args.step == 11:
     )
 
 
+    # Option 3: Augmenting whole batches
+
+    # The same pad, random crop and random brightness as augment(), but each
+    # one vectorized op over the batch with per-example parameters drawn from
+    # the batch seed (see lab_utils.augmentation); only the resize, which
+    # makes the images batchable, is still a map call per image
+    def augment_batch(images_labels, seed):
+        images, labels = images_labels
+        images = tf.image.resize_with_crop_or_pad(images, IMG_SIZE + 6, IMG_SIZE + 6)
+        images = augmentation.augment(images, seed, crop_size=[IMG_SIZE, IMG_SIZE], brightness=0.5)
+        images = tf.clip_by_value(images, 0, 1)
+        return images, labels
+
+    def batch_augmented(ds):
+        ds = ds.map(resize_and_rescale, num_parallel_calls=AUTOTUNE).batch(batch_size)
+        return (
+            tf.data.Dataset.zip((ds, (counter, counter)))
+                .map(augment_batch, num_parallel_calls=AUTOTUNE)
+                .prefetch(AUTOTUNE)
+        )
+
+    train_ds = batch_augmented(train_datasets.shuffle(1000))
+
+    def drain(ds):
+        for _ in ds:
+            pass
+
+    if args.step == 11:
+        # stateless: the same batches and seeds give the same augmented images
+        images, _ = next(iter(batch_augmented(train_datasets.take(batch_size))))
+        images_again, _ = next(iter(batch_augmented(train_datasets.take(batch_size))))
+        assert np.array_equal(images, images_again)
+
+    if args.bench:
+        # decoded images cached, so only resizing and augmenting are timed
+        bench_ds = train_datasets.cache()
+        drain(bench_ds)
+        image_count = tf.data.experimental.cardinality(train_datasets).numpy()
+
+    if args.step == 11 and args.bench:
+        per_example_ds = (
+            tf.data.Dataset.zip((bench_ds, (counter, counter)))
+                .map(augment, num_parallel_calls=AUTOTUNE)
+                .batch(batch_size)
+                .prefetch(AUTOTUNE)
+        )
+        print()
+        bench.run(lambda: drain(per_example_ds), name='augment: per example map (images)', examples=image_count)
+        bench.run(lambda: drain(batch_augmented(bench_ds)), name='augment: per batch (images)', examples=image_count)
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #12 - Benchmark the augmentation strategies
+if args.step == 12 and args.bench:
+    print("\n### Step #12 - Benchmark the augmentation strategies")
+
+    # every strategy starts from the same cached decoded images (bench_ds) with
+    # the same resize and rescale, and feeds the same small model; only where
+    # and how the images are augmented differs. RandomInvert and
+    # random_invert_img see rescaled images here, so only their cost is meaningful.
+    def resized(batch_size):
+        return bench_ds.map(resize_and_rescale, num_parallel_calls=AUTOTUNE).batch(batch_size)
+
+    def invert(image, label):
+        return random_invert_img(image), label
+
+    def augment_layers(images, labels):
+        return data_augmentation(images, training=True), labels
+
+    # name: (dataset of a batch size, augmentation layer of the model)
+    strategies = {
+        'layers in the model': (resized, data_augmentation),
+        'layers in the dataset': (lambda b: resized(b).map(augment_layers, num_parallel_calls=AUTOTUNE), None),
+        'RandomInvert in the model': (resized, RandomInvert()),
+        'random_invert_img in the dataset': (
+            lambda b: bench_ds.map(resize_and_rescale, num_parallel_calls=AUTOTUNE).map(invert, num_parallel_calls=AUTOTUNE).batch(b),
+            None
+        ),
+        'tf.image per example': (
+            lambda b: tf.data.Dataset.zip((bench_ds, (counter, counter))).map(augment, num_parallel_calls=AUTOTUNE).batch(b),
+            None
+        ),
+        'tf.image per batch': (
+            lambda b: tf.data.Dataset.zip((resized(b), (counter, counter))).map(augment_batch, num_parallel_calls=AUTOTUNE),
+            None
+        ),
+    }
+
+    def with_threads(ds, threads):
+        # a private tf.data thread pool of `threads` threads (0: the default pool)
+        if threads:
+            options = tf.data.Options()
+            options.experimental_threading.private_threadpool_size = threads
+            ds = ds.with_options(options)
+        return ds.prefetch(AUTOTUNE)
+
+    def make_model(augmentation_layer):
+        model = Sequential(
+            [tf.keras.layers.InputLayer(input_shape=(IMG_SIZE, IMG_SIZE, 3))] +
+            ([augmentation_layer] if augmentation_layer is not None else []) +
+            [Conv2D(16, 3, padding='same', activation='relu'), MaxPooling2D(), Flatten(), Dense(num_classes)]
+        )
+        model.compile(
+            optimizer='adam',
+            loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+            metrics=['accuracy']
+        )
+        return model
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        for threads in args.data_threads:
+            for name, (make_ds, augmentation_layer) in strategies.items():
+                label = f'{name}, batch {batch_size}, threads {threads or "default"}'
+                ds = with_threads(make_ds(batch_size), threads)
+                pipeline = bench.run(lambda: drain(ds), name=f'pipeline: {label}', examples=image_count)
+
+                model = make_model(augmentation_layer)
+                model.fit(ds.take(2), epochs=1, verbose=0) # traced before the timed epochs
+                epoch = bench.run(lambda: model.fit(ds, epochs=1, verbose=0), name=f'epoch: {label}', examples=image_count)
+                rows.append((name, batch_size, threads, pipeline, epoch))
+
+    print()
+    print(f"{'strategy':34s} {'batch':>5s} {'threads':>7s} | {'pipeline img/s':>14s} {'cpus':>5s} | {'epoch secs':>10s} {'img/s':>8s} {'cpus':>5s}")
+    def number(value, width, precision=1):
+        # '-' for a rate or cpu utilization that could not be measured (as bench.report() does)
+        return f"{value:{width}.{precision}f}" if value is not None else f"{'-':>{width}s}"
+
+    for name, batch_size, threads, pipeline, epoch in sorted(rows, key=lambda row: row[4]['mean']):
+        print(
+            f"{name:34s} {batch_size:5d} {threads or 'auto':>7} | "
+            f"{number(pipeline['examples_per_sec'], 14)} {number(pipeline['cpu_util'], 5)} | "
+            f"{epoch['mean']:10.2f} {number(epoch['examples_per_sec'], 8)} {number(epoch['cpu_util'], 5)}"
+        )
+
+
 ### End of File
 print()
 if args.plot:
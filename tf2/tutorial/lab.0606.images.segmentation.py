@@ -28,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 from PIL import Image
 import pathlib
@@ -39,9 +43,6 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 import tensorflow_datasets as tfds
 from tensorflow_examples.models.pix2pix import pix2pix
 
-### TOC
-if args.step == 0:
-    toc(__file__)
 
 
 if args.step or args.all:
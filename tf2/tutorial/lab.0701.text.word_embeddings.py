@@ -26,6 +26,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import io
 import re
@@ -36,10 +40,7 @@ from tensorflow.keras import Sequential, Model, Input
 from tensorflow.keras.layers import Dense, Embedding, GlobalAveragePooling1D
 from tensorflow.keras.layers.experimental.preprocessing import TextVectorization
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import vocabulary
 
 
 args.step = auto_increment(args.step, args.all)
@@ -186,7 +187,10 @@ if args.step in [5, 6, 7, 8]:
 
     # Make a text-only dataset (no labels) and call adapt to build the vocabulary.
     text_ds = train_ds.map(lambda x, y: x)
-    vectorize_layer.adapt(text_ds)
+    # (the adapted vocabulary is reused across runs with --cache)
+    vocabulary.VocabStore().adapt(
+        vectorize_layer, text_ds, sources=[train_dir, 'training', 0.2, seed], name='imdb'
+    )
 
 
 args.step = auto_increment(args.step, args.all)
@@ -6,11 +6,14 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
-ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--batch', type=int, default=1024, help='batch size: 1024*')
+ap.add_argument('--tokens', type=int, default=2000000, help='corpus size for the benchmark step: 2000000*')
+ap.add_argument('--corpus', nargs='*', default=[], help='text files for the sharded preprocessing step: shakespeare.txt*')
+ap.add_argument('--workers', type=int, default=0, help='preprocessing worker processes: cpus*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +29,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import re
 import string
@@ -36,10 +43,7 @@ from tensorflow.keras.layers.experimental.preprocessing import TextVectorization
 
 import tqdm
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import word2vec
 
 
 SEED = 42
@@ -47,7 +51,7 @@ AUTOTUNE = tf.data.AUTOTUNE
 
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Setup: Vectorize an example sentence
-if args.step in [1, 2, 3, 4]: 
+if args.step in [1, 2, 3, 4, 6]: 
     print("\n### Step #1 - Setup: Vectorize an example sentence")
 
     sentence = "The wide road shimmered in the hot sun"
@@ -162,10 +166,241 @@ args.step = auto_increment(args.step, args.all)
 if args.step == 5: 
     print("\n### Step #5 - Compile all steps into one function: Skip-gram Sampling table")
 
+    # sampling_table[i]: probability of keeping the i-th most common word as a target
     sampling_table = tf.keras.preprocessing.sequence.make_sampling_table(size=10)
     print(sampling_table)
 
-    logger.info('To be continued...')
+
+args.step = auto_increment(args.step, args.all)
+### Step #6 - Compile all steps into one function: Generate training data
+if args.step in [6, 10]: 
+    print("\n### Step #6 - Compile all steps into one function: Generate training data")
+
+    # Steps 2-4 for every sequence, one skip-gram at a time (the tutorial's version).
+    def generate_training_data_loop(sequences, window_size, num_ns, vocab_size, seed):
+        targets, contexts, labels = [], [], []
+        sampling_table = tf.keras.preprocessing.sequence.make_sampling_table(vocab_size)
+
+        for sequence in sequences:
+            positive_skip_grams, _ = tf.keras.preprocessing.sequence.skipgrams(
+                sequence,
+                vocabulary_size=vocab_size,
+                sampling_table=sampling_table,
+                window_size=window_size,
+                negative_samples=0
+            )
+
+            for target_word, context_word in positive_skip_grams:
+                context_class = tf.expand_dims(tf.constant([context_word], dtype="int64"), 1)
+                negative_sampling_candidates, _, _ = tf.random.log_uniform_candidate_sampler(
+                    true_classes=context_class,
+                    num_true=1,
+                    num_sampled=num_ns,
+                    unique=True,
+                    range_max=vocab_size,
+                    seed=seed,
+                    name="negative_sampling"
+                )
+                negative_sampling_candidates = tf.expand_dims(negative_sampling_candidates, 1)
+                context = tf.concat([context_class, negative_sampling_candidates], 0)
+                label = tf.constant([1] + [0]*num_ns, dtype="int64")
+
+                targets.append(target_word)
+                contexts.append(tf.squeeze(context))
+                labels.append(label)
+
+        return targets, contexts, labels
+
+    if args.step == 6:
+        num_ns = 4
+        window_size = 2
+        example_sequences = [example_sequence, example_sequence[::-1]]
+
+        # The vectorized version (lab_utils/word2vec.py) does the same for a whole
+        # (N, sequence_length) array: one numpy op per window offset for the
+        # skip-grams, one for all the negative samples. No subsampling: a
+        # sampling table of this 9-word vocabulary would drop almost every pair.
+        targets, contexts, labels = word2vec.generate_training_data(
+            example_sequences, window_size, num_ns, vocab_size, seed=SEED, sampling_table=None
+        )
+        logger.info(f'targets: {targets.shape}, contexts: {contexts.shape}, labels: {labels.shape}')
+        for target, context, label in list(zip(targets, contexts, labels))[:3]:
+            print(f"{inverse_vocab[target]:10s} => {[inverse_vocab[c] for c in context]}, {label}")
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #7 - Prepare training data for Word2Vec: Vectorize sentences from the corpus
+if args.step in [7, 8, 9, 10]: 
+    print("\n### Step #7 - Prepare training data for Word2Vec: Vectorize sentences from the corpus")
+
+    path_to_file = tf.keras.utils.get_file(
+        'shakespeare.txt',
+        'https://storage.googleapis.com/download.tensorflow.org/data/shakespeare.txt'
+    )
+    text_ds = tf.data.TextLineDataset(path_to_file).filter(lambda x: tf.cast(tf.strings.length(x), bool))
+
+    # lowercase and remove punctuation
+    def custom_standardization(input_data):
+        lowercase = tf.strings.lower(input_data)
+        return tf.strings.regex_replace(lowercase, '[%s]' % re.escape(string.punctuation), '')
+
+    vocab_size = 4096
+    sequence_length = 10
+
+    vectorize_layer = TextVectorization(
+        standardize=custom_standardization,
+        max_tokens=vocab_size,
+        output_mode='int',
+        output_sequence_length=sequence_length
+    )
+    vectorize_layer.adapt(text_ds.batch(1024))
+    inverse_vocab = vectorize_layer.get_vocabulary()
+
+    # (num sentences, sequence_length) in one array, not a list of per-sentence arrays
+    sequences = np.concatenate(list(
+        text_ds.batch(1024).map(vectorize_layer, num_parallel_calls=AUTOTUNE).as_numpy_iterator()
+    ))
+
+    if args.step == 7:
+        logger.info(f'sequences: {sequences.shape}')
+        for seq in sequences[:5]:
+            print(f"{seq} => {[inverse_vocab[i] for i in seq]}")
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #8 - Prepare training data for Word2Vec: Generate training examples from sequences
+if args.step in [8, 9]: 
+    print("\n### Step #8 - Prepare training data for Word2Vec: Generate training examples from sequences")
+
+    num_ns = 4
+    window_size = 2
+    BATCH_SIZE = args.batch # 1024
+
+    # examples are generated chunk by chunk while training, not all upfront
+    dataset = word2vec.make_dataset(
+        sequences, window_size, num_ns, vocab_size, BATCH_SIZE, seed=SEED
+    )
+
+    if args.step == 8:
+        logger.info(f'dataset.element_spec:')
+        print(*dataset.element_spec, sep='\n')
+        (targets, contexts), labels = next(iter(dataset))
+        print()
+        print(f"target_word     : {inverse_vocab[targets[0].numpy()]}")
+        print(f"context_words   : {[inverse_vocab[c] for c in contexts[0].numpy()]}")
+        print(f"label           : {labels[0]}")
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #9 - Model and training
+if args.step in [9, 11]: 
+    print("\n### Step #9 - Model and training")
+
+    class Word2Vec(Model):
+        def __init__(self, vocab_size, embedding_dim):
+            super(Word2Vec, self).__init__()
+            self.target_embedding = Embedding(vocab_size, embedding_dim, input_length=1, name="w2v_embedding")
+            self.context_embedding = Embedding(vocab_size, embedding_dim, input_length=num_ns+1)
+
+        def call(self, pair):
+            target, context = pair
+            # target: (batch,), context: (batch, num_ns+1)
+            word_emb = self.target_embedding(target) # (batch, embed)
+            context_emb = self.context_embedding(context) # (batch, num_ns+1, embed)
+            dots = tf.einsum('be,bce->bc', word_emb, context_emb) # (batch, num_ns+1)
+            return dots
+
+    embedding_dim = 128
+
+    if args.step == 9:
+        word2vec_model = Word2Vec(vocab_size, embedding_dim)
+        word2vec_model.compile(
+            optimizer='adam',
+            loss=tf.keras.losses.CategoricalCrossentropy(from_logits=True),
+            metrics=['accuracy']
+        )
+        word2vec_model.fit(dataset, epochs=args.epochs, verbose=2)
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #10 - Benchmark: per-skip-gram loop vs vectorized generator
+if args.step == 10: 
+    print("\n### Step #10 - Benchmark: per-skip-gram loop vs vectorized generator")
+
+    num_ns = 4
+    window_size = 2
+
+    # a corpus of --tokens tokens by repeating the vectorized shakespeare sentences
+    reps = -(-args.tokens // sequences.size)
+    corpus = np.tile(sequences, (reps, 1))[:args.tokens // sequence_length]
+    logger.info(f'corpus: {corpus.shape} => {corpus.size} tokens\n')
+
+    # the loop is far too slow for the whole corpus, time it on a slice
+    small = corpus[:1000]
+    bench.run(
+        lambda: generate_training_data_loop(small, window_size, num_ns, vocab_size, SEED),
+        name='word2vec: per skip-gram loop (tokens)', examples=small.size
+    )
+    bench.run(
+        lambda: word2vec.generate_training_data(corpus, window_size, num_ns, vocab_size, seed=SEED),
+        name='word2vec: vectorized (tokens)', examples=corpus.size
+    )
+
+    def drain(ds):
+        for _ in ds:
+            pass
+
+    bench.run(
+        lambda: drain(word2vec.make_dataset(corpus, window_size, num_ns, vocab_size, args.batch, seed=SEED)),
+        name='word2vec: tf.data stream (tokens)', examples=corpus.size
+    )
+
+
+args.step = auto_increment(args.step, args.all)
+### Step #11 - Parallel sharded preprocessing
+if args.step == 11: 
+    print("\n### Step #11 - Parallel sharded preprocessing")
+
+    vocab_size = 4096
+    sequence_length = 10
+    num_ns = 4
+    window_size = 2
+
+    corpus_files = args.corpus or [tf.keras.utils.get_file(
+        'shakespeare.txt',
+        'https://storage.googleapis.com/download.tensorflow.org/data/shakespeare.txt'
+    )]
+    out_dir = 'tmp/word2vec/' + os.path.splitext(os.path.basename(corpus_files[0]))[0]
+
+    # vocabulary counts and skip-gram examples are computed by worker processes
+    # and written to sharded TFRecord files; reruns with the same corpus and
+    # parameters reuse them
+    start = time.perf_counter()
+    manifest = word2vec.prepare_subprocess(
+        corpus_files, out_dir, vocab_size=vocab_size, sequence_length=sequence_length,
+        window_size=window_size, num_ns=num_ns, workers=args.workers or None, seed=SEED
+    )
+    logger.info(f'{out_dir}: {manifest["examples"]} examples in {len(manifest["shards"])} shards ({time.perf_counter() - start:.2f} secs)')
+
+    inverse_vocab = word2vec.load_vocab(out_dir)
+    dataset = word2vec.load_examples(out_dir, args.batch, seed=SEED)
+
+    def drain(ds):
+        for _ in ds:
+            pass
+
+    bench.run(
+        lambda: drain(dataset), name='word2vec: sharded TFRecord read (examples)',
+        examples=manifest['examples'] // args.batch * args.batch
+    )
+
+    word2vec_model = Word2Vec(vocab_size, embedding_dim)
+    word2vec_model.compile(
+        optimizer='adam',
+        loss=tf.keras.losses.CategoricalCrossentropy(from_logits=True),
+        metrics=['accuracy']
+    )
+    word2vec_model.fit(dataset, epochs=args.epochs, verbose=2)
 
 
 ### End of File
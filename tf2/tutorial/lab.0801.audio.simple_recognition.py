@@ -6,11 +6,12 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=10, help='number of epochs: 10*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--vectorized', '--no-vectorized', dest='vectorized', default=False, action=BooleanAction, help='batched stft and label lookup: F*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +27,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pathlib
 import seaborn as sns
@@ -35,9 +40,9 @@ from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax, InputLayer
 from tensorflow.keras.layers import Conv2D, MaxPooling2D
 from tensorflow.keras.layers.experimental import preprocessing
 
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import features
+
+
 args.step = auto_increment(args.step, args.all)
 
 
@@ -161,10 +166,41 @@ if args.step >= 3:
         label_id = tf.argmax(label == commands)
         return spectrogram, label_id
 
-    spectrogram_ds = waveform_ds.map(
-        get_spectrogram_and_label_id, num_parallel_calls=AUTOTUNE
+    # vectorized: pad, batch, then one stft call and one table lookup per batch
+    # instead of a map call per clip and a string comparison with every command
+    label_table = tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(commands, tf.range(len(commands), dtype=tf.int64)),
+        default_value=-1
     )
 
+    def pad_waveform(waveform, label):
+        waveform = tf.cast(waveform, tf.float32)
+        return tf.pad(waveform, [[0, 16000 - tf.shape(waveform)[0]]]), label
+
+    def get_spectrograms_and_label_ids(waveforms, labels):
+        # waveforms.shape => (batch, 16000), spectrograms.shape => (batch, 124, 129, 1)
+        spectrograms = tf.abs(tf.signal.stft(waveforms, frame_length=255, frame_step=128))
+        return spectrograms[..., tf.newaxis], label_table.lookup(labels)
+
+    def batched_spectrograms(waveform_ds, batch_size=256):
+        ds = waveform_ds.map(pad_waveform, num_parallel_calls=AUTOTUNE).batch(batch_size)
+        return ds.map(get_spectrograms_and_label_ids, num_parallel_calls=AUTOTUNE)
+
+    def spectrograms(waveform_ds):
+        # one (spectrogram, label_id) element per clip, either way
+        if args.vectorized:
+            return batched_spectrograms(waveform_ds).unbatch()
+        return waveform_ds.map(get_spectrogram_and_label_id, num_parallel_calls=AUTOTUNE)
+
+    # --cache: the spectrograms of a file list are computed once and read
+    # back from disk on later runs (keyed by the files and the functions above)
+    def spectrogram_store(name, files):
+        return features.FeatureStore(
+            name, files, decode_audio, get_spectrogram, get_spectrogram_and_label_id, commands
+        )
+
+    spectrogram_ds = spectrogram_store('speech_commands_train', train_files).dataset(lambda: spectrograms(waveform_ds))
+
     if args.step == 3:
         for waveform, label in waveform_ds.take(1):
             label = label.numpy().decode('utf-8')
@@ -200,6 +236,23 @@ if args.step >= 3:
 
             plt.show(block=False)
 
+        if args.bench:
+            # both paths give the same spectrograms and label ids
+            for (a, b), (c, d) in zip(
+                waveform_ds.map(get_spectrogram_and_label_id).batch(64).take(2),
+                batched_spectrograms(waveform_ds, 64).take(2)
+            ):
+                assert np.allclose(a, c, atol=1e-4) and np.array_equal(b, d)
+
+            def drain(ds):
+                for _ in ds:
+                    pass
+
+            print()
+            per_clip_ds = waveform_ds.map(get_spectrogram_and_label_id, num_parallel_calls=AUTOTUNE).batch(256)
+            bench.run(lambda: drain(per_clip_ds), name='spectrograms: per clip stft (clips)', examples=len(train_files))
+            bench.run(lambda: drain(batched_spectrograms(waveform_ds)), name='spectrograms: batched stft (clips)', examples=len(train_files))
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #4 - Build and train the model
@@ -209,14 +262,12 @@ if args.step >= 4:
     def preprocess_dataset(files):
         files_ds = tf.data.Dataset.from_tensor_slices(files)
         output_ds = files_ds.map(get_waveform_and_label, num_parallel_calls=AUTOTUNE)
-        output_ds = output_ds.map(
-            get_spectrogram_and_label_id,  num_parallel_calls=AUTOTUNE
-        )
+        output_ds = spectrograms(output_ds)
         return output_ds
 
     train_ds = spectrogram_ds
-    val_ds = preprocess_dataset(val_files)
-    test_ds = preprocess_dataset(test_files)
+    val_ds = spectrogram_store('speech_commands_val', val_files).dataset(lambda: preprocess_dataset(val_files))
+    test_ds = spectrogram_store('speech_commands_test', test_files).dataset(lambda: preprocess_dataset(test_files))
 
     batch_size = args.batch # 64
     train_ds = train_ds.batch(batch_size)
@@ -8,11 +8,13 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, bench
 )
 
 ap.add_argument('--epochs', type=int, default=20, help='number of epochs: 20*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--batched', '--no-batched', dest='batched', default=False, action=BooleanAction, help='run yamnet over batches of same-length clips: F*')
+ap.add_argument('--chunk', type=int, default=100, help='streaming chunk size in ms: 100*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -28,6 +30,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 from PIL import Image
@@ -38,10 +44,8 @@ from tensorflow.keras.layers import InputLayer, Layer, Dense
 import tensorflow_hub as hub
 import tensorflow_io as tfio
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import features, audio, streaming
+from lab_utils.cache import fingerprint
 
 
 if args.step or args.all:
@@ -184,10 +188,26 @@ if args.step >= 7:
     def load_wav_for_map(filename, label, fold):
         return load_wav_16k_mono(filename), label, fold
 
-    main_ds = main_ds.map(load_wav_for_map)
-    if args.step == 7:
-        print(*list(main_ds.element_spec), sep='\n')
-    print()
+    # --cache: the clips are decoded and resampled to 16 kHz mono once; later
+    # runs read the waveforms straight from a memory-mapped file. Only built
+    # when the waveforms are needed, not when the embeddings are already stored
+    audio_store = audio.AudioStore('esc50', filenames, load_wav_16k_mono.python_function)
+    clips_ds = main_ds
+
+    def wav_dataset():
+        if not audio_store.enabled:
+            return clips_ds.map(load_wav_for_map)
+        waveform_ds = audio_store.dataset(
+            lambda: tf.data.Dataset.from_tensor_slices(filenames).map(load_wav_16k_mono, num_parallel_calls=tf.data.AUTOTUNE)
+        )
+        return tf.data.Dataset.zip((
+            waveform_ds, tf.data.Dataset.from_tensor_slices(targets), tf.data.Dataset.from_tensor_slices(folds)
+        ))
+
+    def clip_waveform(filename):
+        if audio_store.enabled and audio_store.valid():
+            return audio_store.waveform(filename)
+        return load_wav_16k_mono(filename).numpy()
 
     # applies the embedding extraction model to a wav data
     def extract_embedding(wav_data, label, fold):
@@ -200,11 +220,82 @@ if args.step >= 7:
             tf.repeat(fold, num_embeddings)
         )
 
+    # batched: clips of the same length are batched and run through yamnet in
+    # parallel map calls; yamnet takes one waveform at a time, so a batch is
+    # a map_fn over its clips, and clips of the same length give the same
+    # number of frames, which are then split back out clip by clip
+    def extract_embeddings(wav_data, labels, folds):
+        embeddings = tf.map_fn(
+            lambda wav: yamnet_model(wav)[1], wav_data,
+            fn_output_signature=tf.TensorSpec([None, 1024], tf.float32),
+            parallel_iterations=args.batch
+        )
+        num_embeddings = tf.shape(embeddings)[1] # embeddings.shape => (batch, frames, 1024)
+        return (
+            tf.reshape(embeddings, [-1, 1024]),
+            tf.repeat(labels, num_embeddings),
+            tf.repeat(folds, num_embeddings)
+        )
+
+    def batched_embeddings(wav_ds, batch_size=args.batch):
+        ds = wav_ds.apply(tf.data.experimental.group_by_window(
+            key_func=lambda wav_data, label, fold: tf.cast(tf.shape(wav_data)[0], tf.int64),
+            reduce_func=lambda key, ds: ds.batch(batch_size),
+            window_size=batch_size
+        ))
+        return ds.map(extract_embeddings, num_parallel_calls=tf.data.AUTOTUNE).unbatch()
+
+    def embeddings(wav_ds):
+        # one (embedding, label, fold) element per frame, either way
+        if args.batched:
+            return batched_embeddings(wav_ds)
+        return wav_ds.map(extract_embedding).unbatch()
+
     # extract embedding
-    main_ds = main_ds.map(extract_embedding).unbatch()
+    # --cache: yamnet runs over the clips once; the frame embeddings, labels and
+    # folds are stored, keyed by the clips and the fingerprint of the model files
+    yamnet_fingerprint = fingerprint(hub.resolve(yamnet_model_handle))
+    embedding_store = features.FeatureStore(
+        'esc50_yamnet', filenames, list(targets), list(folds), yamnet_fingerprint, extract_embedding
+    )
+    main_ds = embedding_store.dataset(lambda: embeddings(wav_dataset()))
     if args.step == 7:
+        print(*list(clips_ds.map(load_wav_for_map).element_spec), sep='\n')
+        print()
         print(*list(main_ds.element_spec), sep='\n')
 
+    if args.step == 7 and args.bench:
+        wav_ds = wav_dataset()
+
+        # both paths give the same frames for a clip, with its label and fold
+        one_clip_ds = wav_ds.take(1)
+        for (a, b, c), (d, e, f) in zip(
+            one_clip_ds.map(extract_embedding).unbatch().batch(1024),
+            batched_embeddings(one_clip_ds).batch(1024)
+        ):
+            assert np.allclose(a, d, atol=1e-5) and np.array_equal(b, e) and np.array_equal(c, f)
+
+        def drain(ds):
+            for _ in ds:
+                pass
+
+        print()
+        if audio_store.enabled:
+            files_ds = tf.data.Dataset.from_tensor_slices(filenames)
+            bench.run(
+                lambda: drain(files_ds.map(load_wav_16k_mono, num_parallel_calls=tf.data.AUTOTUNE)),
+                name='waveforms: decode and resample (clips)', examples=len(filenames)
+            )
+            bench.run(lambda: drain(audio_store.load()), name='waveforms: audio store (clips)', examples=len(filenames))
+
+        # waveforms decoded once, so only yamnet is timed
+        cached_wav_ds = wav_ds.cache()
+        drain(cached_wav_ds)
+
+        print()
+        bench.run(lambda: drain(cached_wav_ds.map(extract_embedding).unbatch()), name='yamnet: per clip (clips)', examples=len(filenames))
+        bench.run(lambda: drain(batched_embeddings(cached_wav_ds)), name='yamnet: batched (clips)', examples=len(filenames))
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #8 - ESC-50 dataset: Split the data
@@ -345,7 +436,7 @@ if args.step == 12:
     filename = row['filename'].item()
     logger.info(f'filename: {filename}')
     
-    waveform = load_wav_16k_mono(filename)
+    waveform = clip_waveform(filename)
     logger.info(f'Waveform values: {waveform}')
 
     if args.plot:
@@ -367,6 +458,48 @@ if args.step == 12:
     your_top_score = class_probabilities[your_top_class]
     logger.info(f'[Your model] The main sound is: {your_infered_class} ({your_top_score})')
 
+
+args.step = auto_increment(args.step, args.all)
+### Step #13 - Streaming inference on a long recording
+if args.step == 13: 
+    print("\n### Step #13 - Streaming inference on a long recording")
+
+    # a yamnet frame reads 0.975 secs (0.96 secs patch + stft window) every 0.48 secs;
+    # given the samples of n whole frames, yamnet returns exactly n embeddings
+    frame_length, frame_step = 15600, 7680
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.float32)])
+    def frame_scores(samples):
+        _, embeddings, _ = yamnet_model(samples)
+        return my_model(embeddings)
+
+    # running scores: mean logits of the last 10 frames (~5 secs, the length of an ESC-50 clip)
+    classifier = streaming.StreamingClassifier(
+        lambda samples: frame_scores(samples).numpy(), frame_length, frame_step, window=10
+    )
+
+    # the test clips one after the other, replayed as if they were live audio
+    test_pd = filtered_pd.loc[filtered_pd['fold'] == 5]
+    clips = [clip_waveform(filename) for filename in test_pd['filename']]
+    recording = np.concatenate(clips)
+    chunk_size = 16000 * args.chunk // 1000
+
+    frame_scores(np.zeros(frame_length, dtype=np.float32)) # traced before the replay
+    result = streaming.replay(classifier, recording, chunk_size)
+
+    logger.info(f"{result['duration']:.1f} secs of audio, {result['chunks']} chunks of {args.chunk} ms, {result['frames']} frames")
+    logger.info(f"real-time factor: {result['rtf']:.4f}")
+    logger.info(
+        f"chunk latency: p50 {result['p50']*1000:.2f} ms, p90 {result['p90']*1000:.2f} ms, "
+        f"p99 {result['p99']*1000:.2f} ms, max {result['max']*1000:.2f} ms"
+    )
+
+    # the running class at the end of every clip, against the label of the clip
+    ends = np.cumsum([len(clip) for clip in clips])
+    predictions = [np.argmax(result['scores'][(end - 1) // chunk_size]) for end in ends]
+    accuracy = np.mean(np.array(predictions) == test_pd['target'].to_numpy())
+    logger.info(f'running class at the end of each clip: accuracy {accuracy:.2f} ({len(clips)} clips)')
+
 ### End of File
 print()
 if args.plot:
@@ -28,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 
@@ -37,11 +41,6 @@ from tensorflow.keras.layers import Flatten, Dense, Dropout, Softmax
 from sklearn.model_selection import train_test_split
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 args.step = auto_increment(args.step, args.all)
 ### Step #1 - Use Pandas to create a dataframe
 if args.step >= 1: 
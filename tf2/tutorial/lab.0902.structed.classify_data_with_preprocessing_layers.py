@@ -28,6 +28,10 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
 import time
 import pandas as pd
 from PIL import Image
@@ -39,11 +43,6 @@ from tensorflow.keras.layers.experimental import preprocessing
 from sklearn.model_selection import train_test_split
 
 
-### TOC
-if args.step == 0:
-    toc(__file__)
-
-
 if args.step or args.all:
     if not os.path.exists('tmp/tf2_t0902/'):
         os.mkdir('tmp/tf2_t0902/') 
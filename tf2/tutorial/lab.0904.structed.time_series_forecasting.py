@@ -6,11 +6,13 @@ sys.path.append('../../')
 
 from lab_utils import (
     tf, os, np, plt, logger, ap, BooleanAction,
-    debug, toc, auto_increment
+    debug, toc, auto_increment, StepCache, bench
 )
 
 ap.add_argument('--epochs', type=int, default=20, help='number of epochs: 20*')
 ap.add_argument('--batch', type=int, default=64, help='batch size: 64*')
+ap.add_argument('--zoo', '--no-zoo', dest='zoo', default=False, action=BooleanAction, help='train the single step models in parallel processes at step 17: F*')
+ap.add_argument('--mmap', '--no-mmap', dest='mmap', default=False, action=BooleanAction, help='stream windows from a memory-mapped store: F*')
 args, extra_args = ap.parse_known_args()
 logger.info(args)
 # logger.info(extra_args)
@@ -26,6 +28,15 @@ if args.debug:
     # code.interact(local=locals())
     debug = breakpoint
 
+### TOC
+if args.step == 0:
+    toc(__file__)
+
+# --cache: steps 1-5 (data) and the training steps resume from disk
+# (the step 3 plots need the intermediate columns, so it is recomputed when plotting;
+# the training steps only hold their own model and still need the data steps)
+cache = StepCache(__file__, args, skip=[3] if args.plot else [], partial=[12, 13, 14, 15, 16, 21])
+
 import time
 import pandas as pd
 import seaborn as sns
@@ -39,10 +50,7 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 import tensorflow_datasets as tfds
 from tensorflow_examples.models.pix2pix import pix2pix
 
-
-### TOC
-if args.step == 0:
-    toc(__file__)
+from lab_utils import timeseries, zoo
 
 
 args.step = auto_increment(args.step, args.all)
@@ -50,20 +58,22 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 1: 
     print("\n### Step #1 - The weather dataset")
 
-    zip_path = tf.keras.utils.get_file(
-        origin='https://storage.googleapis.com/tensorflow/tf-keras-datasets/jena_climate_2009_2016.csv.zip',
-        fname='jena_climate_2009_2016.csv.zip',
-        extract=True
-    )
-    csv_path, _ = os.path.splitext(zip_path)
+    if not cache.restore(1, globals()):
+        zip_path = tf.keras.utils.get_file(
+            origin='https://storage.googleapis.com/tensorflow/tf-keras-datasets/jena_climate_2009_2016.csv.zip',
+            fname='jena_climate_2009_2016.csv.zip',
+            extract=True
+        )
+        csv_path, _ = os.path.splitext(zip_path)
 
-    df = pd.read_csv(csv_path)
+        df = pd.read_csv(csv_path)
 
-    # for hourly predictions, start by sub-sampling the data from 10 minute intervals to 1h
-    # slice [start:stop:step], starting from index 5 take every 6th record.
-    df = df[5::6]
+        # for hourly predictions, start by sub-sampling the data from 10 minute intervals to 1h
+        # slice [start:stop:step], starting from index 5 take every 6th record.
+        df = df[5::6]
 
-    date_time = pd.to_datetime(df.pop('Date Time'), format='%d.%m.%Y %H:%M:%S')
+        date_time = pd.to_datetime(df.pop('Date Time'), format='%d.%m.%Y %H:%M:%S')
+        cache.save(1, globals(), ['df', 'date_time'])
 
     if args.step == 1:
         print(df.head())
@@ -85,18 +95,20 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 2: 
     print("\n### Step #2 - The weather dataset: Inspect and cleanup")
 
-    if args.step == 2: print(df.describe().transpose(), '\n')
-
-    # wind velocity
-    wv = df['wv (m/s)']
-    bad_wv = wv == -9999.0
-    wv[bad_wv] = 0.0 # in-line replacement
+    if not cache.restore(2, globals()):
+        # wind velocity
+        wv = df['wv (m/s)']
+        bad_wv = wv == -9999.0
+        wv[bad_wv] = 0.0 # in-line replacement
 
-    max_wv = df['max. wv (m/s)']
-    bad_max_wv = max_wv == -9999.0
-    max_wv[bad_max_wv] = 0.0 # in-line replacement
+        max_wv = df['max. wv (m/s)']
+        bad_max_wv = max_wv == -9999.0
+        max_wv[bad_max_wv] = 0.0 # in-line replacement
+        cache.save(2, globals(), ['df', 'date_time'])
 
     if args.step == 2:
+        print(df.describe().transpose(), '\n')
+
         # The above inplace edits are reflected in the DataFrame
         logger.info(f"df['wv (m/s)'].min(): {df['wv (m/s)'].min()}")
 
@@ -106,75 +118,77 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 3: 
     print("\n### Step #3 - The weather dataset: Feature engineering")
 
-    ## wind
-    if args.step == 3 and args.plot:
-        plt.figure()
-        plt.hist2d(df['wd (deg)'], df['wv (m/s)'], bins=(50, 50), vmax=400)
-        plt.colorbar()
-        plt.xlabel('Wind Direction [deg]')
-        plt.ylabel('Wind Velocity [m/s]')    
-        plt.show(block=False)
+    if not cache.restore(3, globals()):
+        ## wind
+        if args.step == 3 and args.plot:
+            plt.figure()
+            plt.hist2d(df['wd (deg)'], df['wv (m/s)'], bins=(50, 50), vmax=400)
+            plt.colorbar()
+            plt.xlabel('Wind Direction [deg]')
+            plt.ylabel('Wind Velocity [m/s]')    
+            plt.show(block=False)
 
-    wv = df.pop('wv (m/s)')
-    max_wv = df.pop('max. wv (m/s)')
+        wv = df.pop('wv (m/s)')
+        max_wv = df.pop('max. wv (m/s)')
 
-    # Convert to radians.
-    wd_rad = df.pop('wd (deg)')*np.pi / 180
+        # Convert to radians.
+        wd_rad = df.pop('wd (deg)')*np.pi / 180
 
-    # Calculate the wind x and y components.
-    df['Wx'] = wv*np.cos(wd_rad)
-    df['Wy'] = wv*np.sin(wd_rad)
+        # Calculate the wind x and y components.
+        df['Wx'] = wv*np.cos(wd_rad)
+        df['Wy'] = wv*np.sin(wd_rad)
 
-    # Calculate the max wind x and y components.
-    df['max Wx'] = max_wv*np.cos(wd_rad)
-    df['max Wy'] = max_wv*np.sin(wd_rad)
+        # Calculate the max wind x and y components.
+        df['max Wx'] = max_wv*np.cos(wd_rad)
+        df['max Wy'] = max_wv*np.sin(wd_rad)
 
-    if args.step == 3 and args.plot:
-        plt.figure()
-        plt.hist2d(df['Wx'], df['Wy'], bins=(50, 50), vmax=400)
-        plt.colorbar()
-        plt.xlabel('Wind X [m/s]')
-        plt.ylabel('Wind Y [m/s]')
-        ax = plt.gca()
-        ax.axis('tight')
-        plt.show(block=False)
+        if args.step == 3 and args.plot:
+            plt.figure()
+            plt.hist2d(df['Wx'], df['Wy'], bins=(50, 50), vmax=400)
+            plt.colorbar()
+            plt.xlabel('Wind X [m/s]')
+            plt.ylabel('Wind Y [m/s]')
+            ax = plt.gca()
+            ax.axis('tight')
+            plt.show(block=False)
 
-    ## time
-    # Start by converting it to seconds
-    timestamp_s = date_time.map(pd.Timestamp.timestamp)
+        ## time
+        # Start by converting it to seconds
+        timestamp_s = date_time.map(pd.Timestamp.timestamp)
 
-    day = 24*60*60
-    year = (365.2425)*day
+        day = 24*60*60
+        year = (365.2425)*day
 
-    df['Day sin'] = np.sin(timestamp_s * (2 * np.pi / day))
-    df['Day cos'] = np.cos(timestamp_s * (2 * np.pi / day))
-    df['Year sin'] = np.sin(timestamp_s * (2 * np.pi / year))
-    df['Year cos'] = np.cos(timestamp_s * (2 * np.pi / year))
+        df['Day sin'] = np.sin(timestamp_s * (2 * np.pi / day))
+        df['Day cos'] = np.cos(timestamp_s * (2 * np.pi / day))
+        df['Year sin'] = np.sin(timestamp_s * (2 * np.pi / year))
+        df['Year cos'] = np.cos(timestamp_s * (2 * np.pi / year))
 
-    if args.step == 3 and args.plot:
-        plt.figure()
-        plt.plot(np.array(df['Day sin'])[:25])
-        plt.plot(np.array(df['Day cos'])[:25])
-        plt.xlabel('Time [h]')
-        plt.title('Time of day signal')
-        plt.show(block=False)
+        if args.step == 3 and args.plot:
+            plt.figure()
+            plt.plot(np.array(df['Day sin'])[:25])
+            plt.plot(np.array(df['Day cos'])[:25])
+            plt.xlabel('Time [h]')
+            plt.title('Time of day signal')
+            plt.show(block=False)
 
-        fft = tf.signal.rfft(df['T (degC)'])
-        f_per_dataset = np.arange(0, len(fft))
+            fft = tf.signal.rfft(df['T (degC)'])
+            f_per_dataset = np.arange(0, len(fft))
 
-        n_samples_h = len(df['T (degC)'])
-        hours_per_year = 24*365.2524
-        years_per_dataset = n_samples_h/(hours_per_year)
+            n_samples_h = len(df['T (degC)'])
+            hours_per_year = 24*365.2524
+            years_per_dataset = n_samples_h/(hours_per_year)
 
-        f_per_year = f_per_dataset/years_per_dataset
-        plt.figure()
-        plt.step(f_per_year, np.abs(fft))
-        plt.xscale('log')
-        plt.ylim(0, 400000)
-        plt.xlim([0.1, max(plt.xlim())])
-        plt.xticks([1, 365.2524], labels=['1/Year', '1/day'])
-        _ = plt.xlabel('Frequency (log scale)')
-        plt.show(block=False)
+            f_per_year = f_per_dataset/years_per_dataset
+            plt.figure()
+            plt.step(f_per_year, np.abs(fft))
+            plt.xscale('log')
+            plt.ylim(0, 400000)
+            plt.xlim([0.1, max(plt.xlim())])
+            plt.xticks([1, 365.2524], labels=['1/Year', '1/day'])
+            _ = plt.xlabel('Frequency (log scale)')
+            plt.show(block=False)
+        cache.save(3, globals(), ['df'])
 
 
 args.step = auto_increment(args.step, args.all)
@@ -182,16 +196,18 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 4: 
     print("\n### Step #4 - The weather dataset: Split the data")
 
-    column_indices = {name: i for i, name in enumerate(df.columns)}
+    if not cache.restore(4, globals()):
+        column_indices = {name: i for i, name in enumerate(df.columns)}
 
-    # (70%, 20%, 10%) split for the training, validation, and test sets
-    # data is not being randomly shuffled before splitting
-    n = len(df)
-    train_df = df[0:int(n*0.7)]
-    val_df = df[int(n*0.7):int(n*0.9)]
-    test_df = df[int(n*0.9):]
+        # (70%, 20%, 10%) split for the training, validation, and test sets
+        # data is not being randomly shuffled before splitting
+        n = len(df)
+        train_df = df[0:int(n*0.7)]
+        val_df = df[int(n*0.7):int(n*0.9)]
+        test_df = df[int(n*0.9):]
 
-    num_features = df.shape[1]
+        num_features = df.shape[1]
+        cache.save(4, globals(), ['df', 'column_indices', 'n', 'train_df', 'val_df', 'test_df', 'num_features'])
 
     if args.step == 4:
         logger.info(f'train_df: {len(train_df)}')
@@ -205,12 +221,27 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 5: 
     print("\n### Step #5 - The weather dataset: Normalize the data")
 
-    train_mean = train_df.mean()
-    train_std = train_df.std()
+    if not cache.restore(5, globals()):
+        train_mean = train_df.mean()
+        train_std = train_df.std()
+
+        train_df = (train_df - train_mean) / train_std
+        val_df = (val_df - train_mean) / train_std
+        test_df = (test_df - train_mean) / train_std
+        cache.save(5, globals(), [
+            'df', 'column_indices', 'n', 'train_df', 'val_df', 'test_df', 'num_features',
+            'train_mean', 'train_std'
+        ])
 
-    train_df = (train_df - train_mean) / train_std
-    val_df = (val_df - train_mean) / train_std
-    test_df = (test_df - train_mean) / train_std
+    # --mmap: the normalized splits are written once to a memory-mapped store
+    # (keyed like the step 5 cache entry) and windows are read from it
+    def open_store():
+        store = timeseries.SeriesStore(os.path.join('tmp/jena', cache.keys[5]))
+        if not store.valid():
+            store.write({'train': train_df, 'val': val_df, 'test': test_df}, train_df.columns, train_mean, train_std)
+        return store
+
+    store = open_store() if args.mmap else None
 
     if args.step == 5 and args.plot:
         df_std = (df - train_mean) / train_std
@@ -389,32 +420,42 @@ if args.step >= 9:
     print("\n### Step #9 - Data windowing: Create tf.data.Datasets")
 
     def make_dataset(self, data):
-        data = np.array(data, dtype=np.float32)
-        ds = tf.keras.preprocessing.timeseries_dataset_from_array(
-            data=data,
-            targets=None,
-            sequence_length=self.total_window_size,
-            sequence_stride=1,
-            shuffle=False, # should be True
+        # same windows as timeseries_dataset_from_array(sequence_stride=1), but
+        # gathered per batch from one float32 buffer of the split, shared by all
+        # window generators, instead of being sliced out one by one
+        ds = timeseries.window_dataset(
+            data,
+            window_size=self.total_window_size,
             batch_size=32,
+            shuffle=False, # should be True
         )
 
-        ds = ds.map(self.split_window)
+        ds = ds.map(self.split_window, num_parallel_calls=tf.data.AUTOTUNE)
         return ds
 
     WindowGenerator.make_dataset = make_dataset
 
+    def get_dataset(self, split):
+        # one dataset per split, built on first access (from the store with --mmap)
+        datasets = self.__dict__.setdefault('_datasets', {})
+        if split not in datasets:
+            data = store.split(split) if store is not None else getattr(self, f'{split}_df')
+            datasets[split] = self.make_dataset(data)
+        return datasets[split]
+
+    WindowGenerator.get_dataset = get_dataset
+
     @property
     def train(self):
-      return self.make_dataset(self.train_df)
+      return self.get_dataset('train')
 
     @property
     def val(self):
-      return self.make_dataset(self.val_df)
+      return self.get_dataset('val')
 
     @property
     def test(self):
-      return self.make_dataset(self.test_df)
+      return self.get_dataset('test')
 
     @property
     def example(self):
@@ -443,6 +484,27 @@ if args.step >= 9:
             print(f'Inputs shape (batch, time, features): {example_inputs.shape}')
             print(f'Labels shape (batch, time, features): {example_labels.shape}')
 
+        if args.bench:
+            # the gathered windows match timeseries_dataset_from_array() window for window
+            def from_array(self, data):
+                return tf.keras.preprocessing.timeseries_dataset_from_array(
+                    data=np.array(data, dtype=np.float32), targets=None,
+                    sequence_length=self.total_window_size, sequence_stride=1,
+                    shuffle=False, batch_size=32,
+                ).map(self.split_window)
+
+            for (a, b), (c, d) in zip(w2.train.take(3), from_array(w2, train_df).take(3)):
+                assert np.array_equal(a, c) and np.array_equal(b, d)
+
+            def drain(ds):
+                for _ in ds:
+                    pass
+
+            windows = timeseries.num_windows(len(train_df), w2.total_window_size)
+            print()
+            bench.run(lambda: drain(from_array(w2, train_df)), name='windows: timeseries_dataset_from_array', examples=windows)
+            bench.run(lambda: drain(w2.train), name='windows: gathered from one buffer', examples=windows)
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #10 - Single step models
@@ -531,15 +593,20 @@ if args.step >= 12:
 
         return history
 
+    # --zoo: the single step models are only defined in steps 12-16 and
+    # trained together at step 17, each in its own process
+    train_here = not args.zoo
+
     if args.step == 12:
         logger.info('linear model on single_step_window:')
         print(f'Input shape: {single_step_window.example[0].shape}')
         print(f'Output shape: {linear(single_step_window.example[0]).shape}\n')
 
-    history = compile_and_fit(linear, single_step_window, verbose=args.step==12)
-
-    val_performance['Linear'] = linear.evaluate(single_step_window.val, verbose=0)
-    performance['Linear'] = linear.evaluate(single_step_window.test, verbose=0)
+    if train_here and not cache.restore(12, globals()):
+        history = compile_and_fit(linear, single_step_window, verbose=args.step==12)
+        val_performance['Linear'] = linear.evaluate(single_step_window.val, verbose=0)
+        performance['Linear'] = linear.evaluate(single_step_window.test, verbose=0)
+        cache.save(12, globals(), ['linear', 'val_performance', 'performance'])
 
     if args.step == 12: 
         print()
@@ -575,10 +642,11 @@ if args.step >= 13:
         print(f'Input shape: {single_step_window.example[0].shape}')
         print(f'Output shape: {dense(single_step_window.example[0]).shape}\n')
 
-    history = compile_and_fit(dense, single_step_window, verbose=args.step==13)
-
-    val_performance['Dense'] = dense.evaluate(single_step_window.val, verbose=0)
-    performance['Dense'] = dense.evaluate(single_step_window.test, verbose=0)
+    if train_here and not cache.restore(13, globals()):
+        history = compile_and_fit(dense, single_step_window, verbose=args.step==13)
+        val_performance['Dense'] = dense.evaluate(single_step_window.val, verbose=0)
+        performance['Dense'] = dense.evaluate(single_step_window.test, verbose=0)
+        cache.save(13, globals(), ['dense', 'val_performance', 'performance'])
 
     if args.step == 13:
         print()
@@ -621,10 +689,11 @@ if args.step >= 14:
         tf.keras.layers.Reshape([1, -1]),
     ])
 
-    history = compile_and_fit(multi_step_dense, conv_window, verbose=args.step==14)
-
-    val_performance['Multi step dense'] = multi_step_dense.evaluate(conv_window.val, verbose=0)
-    performance['Multi step dense'] = multi_step_dense.evaluate(conv_window.test, verbose=0)
+    if train_here and not cache.restore(14, globals()):
+        history = compile_and_fit(multi_step_dense, conv_window, verbose=args.step==14)
+        val_performance['Multi step dense'] = multi_step_dense.evaluate(conv_window.val, verbose=0)
+        performance['Multi step dense'] = multi_step_dense.evaluate(conv_window.test, verbose=0)
+        cache.save(14, globals(), ['multi_step_dense', 'val_performance', 'performance'])
 
     if args.step == 14:
         print()
@@ -650,9 +719,11 @@ if args.step >= 15:
     ])
 
 
-    history = compile_and_fit(conv_model, conv_window, verbose=args.step==15)
-    val_performance['Conv'] = conv_model.evaluate(conv_window.val, verbose=0)
-    performance['Conv'] = conv_model.evaluate(conv_window.test, verbose=0)
+    if train_here and not cache.restore(15, globals()):
+        history = compile_and_fit(conv_model, conv_window, verbose=args.step==15)
+        val_performance['Conv'] = conv_model.evaluate(conv_window.val, verbose=0)
+        performance['Conv'] = conv_model.evaluate(conv_window.test, verbose=0)
+        cache.save(15, globals(), ['conv_model', 'val_performance', 'performance'])
 
     if args.step == 15:
         print()
@@ -694,9 +765,11 @@ if args.step >= 16:
         tf.keras.layers.Dense(units=1)
     ])
 
-    history = compile_and_fit(lstm_model, wide_window, verbose=args.step==16)
-    val_performance['LSTM'] = lstm_model.evaluate(wide_window.val, verbose=0)
-    performance['LSTM'] = lstm_model.evaluate(wide_window.test, verbose=0)
+    if train_here and not cache.restore(16, globals()):
+        history = compile_and_fit(lstm_model, wide_window, verbose=args.step==16)
+        val_performance['LSTM'] = lstm_model.evaluate(wide_window.val, verbose=0)
+        performance['LSTM'] = lstm_model.evaluate(wide_window.test, verbose=0)
+        cache.save(16, globals(), ['lstm_model', 'val_performance', 'performance'])
 
     if args.step == 16:
         logger.info("lstm model on wide_window:")
@@ -712,6 +785,26 @@ args.step = auto_increment(args.step, args.all)
 if args.step == 17: 
     print("\n### Step #17 - Single step models: Performance")
 
+    if args.zoo:
+        models = {
+            'Linear': (linear, single_step_window),
+            'Dense': (dense, single_step_window),
+            'Multi step dense': (multi_step_dense, conv_window),
+            'Conv': (conv_model, conv_window),
+            'LSTM': (lstm_model, wide_window),
+        }
+        # all windows are read from the same memory-mapped store
+        results = zoo.train(
+            {name: zoo.candidate(model, window) for name, (model, window) in models.items()},
+            store or open_store(), epochs=MAX_EPOCHS
+        )
+        for name, r in results.items():
+            if r['status'] == 'ok':
+                models[name][0].load_weights(r['weights']).expect_partial()
+                val_performance[name], performance[name] = r['val'], r['test']
+        zoo.print_report(results)
+        print()
+
     for name, value in performance.items():
         print(f'{name:12s}: {value[1]:0.4f}')
 
@@ -719,7 +812,7 @@ if args.step == 17:
         x = np.arange(len(performance))
         width = 0.3
         metric_name = 'mean_absolute_error'
-        metric_index = lstm_model.metrics_names.index('mean_absolute_error')
+        metric_index = 1 # [loss, mean_absolute_error], lstm_model may be restored uncompiled
         val_mae = [v[metric_index] for v in val_performance.values()]
         test_mae = [v[metric_index] for v in performance.values()]
 
@@ -743,6 +836,19 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 19: 
     print("\n### Step #19 - Multi-step models")
 
+    OUT_STEPS = 24
+    multi_window = WindowGenerator(
+        input_width=24, label_width=OUT_STEPS, shift=OUT_STEPS
+    )
+
+    multi_val_performance = {}
+    multi_performance = {}
+
+    if args.step == 19:
+        logger.info(f'multi_window:\n{multi_window}')
+        if args.plot:
+            multi_window.plot()
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #19 - Multi-step models: Baselines
@@ -761,6 +867,141 @@ args.step = auto_increment(args.step, args.all)
 if args.step >= 21: 
     print("\n### Step #21 - Multi-step models: Autoregressive model")
 
+    class FeedBack(tf.keras.Model):
+        def __init__(self, units, out_steps):
+            super().__init__()
+            self.out_steps = out_steps
+            self.units = units
+            self.lstm_cell = tf.keras.layers.LSTMCell(units)
+            # Also wrap the LSTMCell in an RNN to simplify the `warmup` method.
+            self.lstm_rnn = tf.keras.layers.RNN(self.lstm_cell, return_state=True)
+            self.dense = tf.keras.layers.Dense(num_features)
+
+    def warmup(self, inputs):
+        # inputs.shape => (batch, time, features)
+        # x.shape => (batch, lstm_units)
+        x, *state = self.lstm_rnn(inputs)
+
+        # predictions.shape => (batch, features)
+        prediction = self.dense(x)
+        return prediction, state
+
+    FeedBack.warmup = warmup
+
+    def rollout(self, x, state, training=None):
+        # the out_steps predictions following the lstm output x, feeding each
+        # prediction back in; `state` itself is left as it is
+        predictions = []
+        prediction = self.dense(x)
+        predictions.append(prediction)
+        for n in range(1, self.out_steps):
+            x, state = self.lstm_cell(prediction, states=state, training=training)
+            prediction = self.dense(x)
+            predictions.append(prediction)
+
+        # predictions.shape => (time, batch, features) => (batch, time, features)
+        predictions = tf.stack(predictions)
+        return tf.transpose(predictions, [1, 0, 2])
+
+    FeedBack.rollout = rollout
+
+    def call(self, inputs, training=None):
+        x, *state = self.lstm_rnn(inputs, training=training)
+        return self.rollout(x, state, training=training)
+
+    FeedBack.call = call
+
+    # streaming: the lstm state is kept between calls, so a new observation
+    # costs one cell step plus the rollout instead of a pass over the whole input
+    # (batch: any number of independent series, traced once per feature shape)
+    @tf.function(experimental_relax_shapes=True)
+    def stream_start(self, inputs):
+        x, *state = self.lstm_rnn(inputs)
+        return self.rollout(x, state), state
+
+    @tf.function(experimental_relax_shapes=True)
+    def stream_update(self, observation, state):
+        # observation.shape => (batch, features)
+        x, state = self.lstm_cell(observation, states=state)
+        return self.rollout(x, state), state
+
+    FeedBack.stream_start = stream_start
+    FeedBack.stream_update = stream_update
+
+    class ForecastStream():
+        """Next OUT_STEPS predictions of a batch of series, updated one timestep at a time.
+
+        The forecasts condition on everything seen since start, not only on the
+        last input_width steps like a fresh call of the model on a window does.
+        """
+        def __init__(self, model, history):
+            # history.shape => (series, time, features)
+            self.model = model
+            self.forecast, self.state = model.stream_start(tf.convert_to_tensor(history, tf.float32))
+
+        def update(self, observation):
+            self.forecast, self.state = self.model.stream_update(
+                tf.convert_to_tensor(observation, tf.float32), self.state
+            )
+            return self.forecast
+
+    feedback_model = FeedBack(units=32, out_steps=OUT_STEPS)
+
+    if args.step == 21:
+        prediction, state = feedback_model.warmup(multi_window.example[0])
+        logger.info(f'warmup prediction shape: {prediction.shape}')
+        print('Output shape (batch, time, features): ', feedback_model(multi_window.example[0]).shape)
+        print()
+
+    if not cache.restore(21, globals()):
+        history = compile_and_fit(feedback_model, multi_window, verbose=args.step==21)
+        multi_val_performance['AR LSTM'] = feedback_model.evaluate(multi_window.val, verbose=0)
+        multi_performance['AR LSTM'] = feedback_model.evaluate(multi_window.test, verbose=0)
+        cache.save(21, globals(), ['feedback_model', 'multi_val_performance', 'multi_performance'])
+
+    if args.step == 21:
+        if args.plot:
+            multi_window.plot(feedback_model)
+
+        # streaming vs recomputing the forecast from scratch on each new observation
+        test = timeseries.as_array(test_df)
+        width, updates = multi_window.input_width, 48
+
+        def stream_series(series):
+            # series.shape => (n, width + updates, features)
+            stream = ForecastStream(feedback_model, series[:, :width])
+            for t in range(width, width + updates):
+                forecast = stream.update(series[:, t])
+            return forecast.numpy()
+
+        @tf.function(experimental_relax_shapes=True)
+        def recompute(inputs):
+            return feedback_model(inputs)
+
+        def recompute_series(series):
+            # the current path: the model on the latest window, for every new observation
+            for t in range(width, width + updates):
+                forecast = recompute(series[:, t+1-width:t+1])
+            return forecast.numpy()
+
+        # same state => same forecast: streaming after the window matches one call on window + updates
+        series = test[np.newaxis, :width + updates]
+        assert np.allclose(stream_series(series), feedback_model(series).numpy(), atol=1e-4)
+
+        if args.bench:
+            logger.info(f'{updates} updates of 1 series:')
+            bench.run(lambda: stream_series(series), name='AR LSTM: streaming update', examples=updates)
+            bench.run(lambda: recompute_series(series), name='AR LSTM: full recompute', examples=updates)
+
+            num_series = 1024
+            rng = np.random.default_rng(42)
+            starts = rng.integers(0, len(test) - width - updates, num_series)
+            batch = test[starts[:, np.newaxis] + np.arange(width + updates)]
+            print()
+            logger.info(f'{updates} updates of {num_series} series at once:')
+            bench.run(lambda: stream_series(batch), name='AR LSTM: batched streaming update', examples=updates * num_series)
+            bench.run(lambda: recompute_series(batch), name='AR LSTM: batched full recompute', examples=updates * num_series)
+
 
 args.step = auto_increment(args.step, args.all)
 ### Step #22 - Multi-step models: Performance